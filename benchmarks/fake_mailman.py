@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+API_PREFIX = '/3.1'
+LANGUAGES = ['en', 'fr', 'de']
+LIST_COLLECTIONS = ['roster/owner', 'roster/moderator', 'roster/nonmember', 'held', 'requests']
+QUEUES = ['archive', 'bad', 'bounces', 'command', 'digest', 'in', 'nntp', 'out', 'pipeline', 'retry', 'shunt', 'virgin']
+
+
+class FakeMailman:
+    """In-process Mailman 3.1 REST server answering with synthetic payloads of a configurable size."""
+
+    def __init__(self, lists: int = 100, domains: int = 10, users: int = 1000, latency: float = 0.0):
+        self.lists = lists
+        self.domains = domains
+        self.users = users
+        self.latency = latency
+        self.requests = 0
+        self._bodies: dict[str, Optional[bytes]] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeMailman':
+        fake = self
+
+        class Handler(FakeMailmanHandler):
+            mailman = fake
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-mailman', daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def body(self, target: str) -> Optional[bytes]:
+        # Payloads are rendered once so the fake server costs as little as possible inside measured scrapes
+        if target not in self._bodies:
+            url = urlparse(target)
+            path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+            response = self.response(path, parse_qs(url.query))
+            self._bodies[target] = None if response is None else json.dumps(response).encode()
+        return self._bodies[target]
+
+    def mailing_list(self, index: int) -> dict[str, Any]:
+        domain = f"domain{index % self.domains}.example.com"
+        return {
+            'advertised': True,
+            'description': f"Synthetic list number {index}",
+            'display_name': f"List{index}",
+            'fqdn_listname': f"list{index}@{domain}",
+            'http_etag': f'"{index:040x}"',
+            'list_id': f"list{index}.{domain}",
+            'list_name': f"list{index}",
+            'mail_host': domain,
+            'member_count': (index * 7919) % 5000,
+            'self_link': f"http://localhost:8001/3.1/lists/list{index}.{domain}",
+            'volume': 1,
+        }
+
+    @staticmethod
+    def address_entry(index: int) -> dict[str, Any]:
+        address = {'email': f"user{index}@example.com", 'original_email': f"user{index}@example.com"}
+        if index % 3:
+            address['verified_on'] = '2024-01-01T00:00:00'
+        if index % 5:
+            address['user'] = f"http://localhost:8001/3.1/users/{index}"
+        return address
+
+    def response(self, path: str, query: dict[str, list[str]]) -> Optional[dict[str, Any]]:
+        if path == '/system/versions':
+            return {'api_version': '3.1', 'mailman_version': 'GNU Mailman 3.3.9 (Tom Sawyer)', 'python_version': '3.11'}
+        if path == '/domains':
+            return self.collection(self.domains, query, lambda index: {'mail_host': f"domain{index}.example.com"})
+        if path == '/lists':
+            return self.collection(self.lists, query, self.mailing_list)
+        if path == '/users':
+            return self.collection(self.users, query, lambda index: {'user_id': index, 'display_name': f"User {index}"})
+        if path.startswith('/users/') and path.endswith('/preferences'):
+            user_id = int(path[len('/users/'):-len('/preferences')])
+            return {} if user_id % 7 == 0 else {'preferred_language': LANGUAGES[user_id % len(LANGUAGES)]}
+        if path == '/addresses':
+            return self.collection(self.users, query, self.address_entry)
+        if path == '/members':
+            # Every other user is subscribed, to two lists
+            return self.collection(self.users, query, lambda index: {'user': f"http://localhost:8001/3.1/users/{index // 2 * 2}"})
+        if path.startswith('/lists/'):
+            # /lists/list<i>@<domain>/<collection>, sized after the list number
+            fqdn_listname, _, collection = path[len('/lists/'):].partition('/')
+            if collection not in LIST_COLLECTIONS or not fqdn_listname.startswith('list'):
+                return None
+            size = (int(fqdn_listname[len('list'):].partition('@')[0]) + LIST_COLLECTIONS.index(collection)) % 4
+            return self.collection(size, query, lambda index: {'email': f"user{index}@example.com"})
+        if path == '/queues':
+            entries = [{'name': name, 'count': index, 'directory': f"/var/lib/mailman/queue/{name}"} for index, name in enumerate(QUEUES)]
+            return {'start': 0, 'total_size': len(entries), 'entries': entries}
+        return None
+
+    @staticmethod
+    def collection(size: int, query: dict[str, list[str]], entry) -> dict[str, Any]:
+        start, stop = 0, size
+        if 'count' in query and 'page' in query:
+            count, page = int(query['count'][0]), int(query['page'][0])
+            start = min(size, (page - 1) * count)
+            stop = min(size, start + count)
+        response = {'start': start, 'total_size': size}
+        if stop > start:
+            response['entries'] = [entry(index) for index in range(start, stop)]
+        return response
+
+
+class FakeMailmanHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    mailman: FakeMailman
+
+    def do_GET(self) -> None:
+        self.mailman.count_request()
+        if self.mailman.latency:
+            time.sleep(self.mailman.latency)
+        body = self.mailman.body(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
@@ -0,0 +1,69 @@
+"""
+    Memory retained per mailing list by the ways of keeping the /lists collection between refreshes.
+
+    python3 -m benchmarks.list_memory_benchmark --lists 1000,10000,100000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from typing import Any, Callable
+from benchmarks.fake_mailman import FakeMailman
+from benchmarks.scrape_benchmark import print_table
+from src.list_store import ListStore
+
+
+def raw_entries(entries: list[dict[str, Any]]) -> Any:
+    return entries
+
+
+def tuple_entries(entries: list[dict[str, Any]]) -> Any:
+    return [(e['fqdn_listname'], e['member_count']) for e in entries]
+
+
+def list_store(entries: list[dict[str, Any]]) -> Any:
+    lists = ListStore(len(entries))
+    lists.extend(entries)
+    lists.seal()
+    return lists
+
+
+LAYOUTS: dict[str, Callable[[list[dict[str, Any]]], Any]] = {
+    'raw JSON dicts': raw_entries,
+    'name/count tuples': tuple_entries,
+    'ListStore': list_store,
+}
+
+
+def retained(lists: int, layout: Callable[[list[dict[str, Any]]], Any]) -> int:
+    fake = FakeMailman(lists=lists)
+    payload = json.dumps(fake.collection(lists, {}, fake.mailing_list)['entries']).encode()
+    # Steady state of a long running exporter, the interpreter already grew its tables during a previous refresh
+    layout(json.loads(payload))
+    gc.collect()
+    tracemalloc.start()
+    # Decoding is traced too, what the layout keeps alive is what remains once the decoded page is dropped
+    kept = layout(json.loads(payload))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Mailman3 exporter list store memory benchmark')
+    parser.add_argument('--lists', default='1000,10000,100000', help='Comma separated numbers of lists to benchmark (default: 1000,10000,100000)')
+    args = parser.parse_args()
+
+    rows = []
+    for lists in sorted(int(lists) for lists in args.lists.split(',')):
+        row = {'lists': str(lists)}
+        for name, layout in LAYOUTS.items():
+            row[f"{name} B/list"] = f"{retained(lists, layout) / lists:.0f}"
+        rows.append(row)
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+    Scrape latency and memory benchmark of Mailman3Collector against an in-process fake Mailman.
+
+    python3 -m benchmarks.scrape_benchmark --lists 10,1000,10000,100000 --latency 0.002 -- --cache false
+"""
+import argparse
+import logging
+import resource
+import statistics
+import time
+import tracemalloc
+from typing import Callable
+from urllib.request import Request, urlopen
+from prometheus_client import CollectorRegistry, generate_latest
+from benchmarks.fake_mailman import FakeMailman
+from src.api import Api
+from src.collectors.mailman3_collector import Mailman3Collector
+from src.config import Config
+from src.http_server import start_server
+
+
+def percentile(samples: list[float], percent: int) -> float:
+    if len(samples) < 2:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[percent - 1]
+
+
+def measure(scrape: Callable[[], int], scrapes: int) -> tuple[list[float], int, int]:
+    size = scrape()
+    timings = []
+    for _ in range(scrapes):
+        start = time.perf_counter()
+        scrape()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    scrape()
+    _, allocated_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, allocated_peak, size
+
+
+def run_scale(lists: int, args: argparse.Namespace) -> dict[str, str]:
+    fake = FakeMailman(lists=lists, domains=args.domains, users=args.users, latency=args.latency).start()
+    config = Config(['-m', fake.address, '--log-level', 'warning', *args.exporter_args])
+    api = Api(config)
+    registry = CollectorRegistry()
+    collector = Mailman3Collector(api=api, config=config, registry=registry)
+
+    if args.http:
+        server = start_server('127.0.0.1', 0, registry)
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+
+        def scrape() -> int:
+            with urlopen(Request(url, headers={'Accept-Encoding': 'gzip'})) as response:
+                return len(response.read())
+    else:
+        server = None
+
+        def scrape() -> int:
+            return len(generate_latest(registry))
+
+    requests_before = fake.requests
+    timings, allocated_peak, size = measure(scrape, args.scrapes)
+    requests_per_scrape = (fake.requests - requests_before) / (args.scrapes + 2)
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    collector.close()
+    api.close()
+    fake.stop()
+    return {
+        'lists': str(lists),
+        'p50 ms': f"{percentile(timings, 50) * 1000:.2f}",
+        'p99 ms': f"{percentile(timings, 99) * 1000:.2f}",
+        'alloc peak KiB': f"{allocated_peak / 1024:.0f}",
+        'max RSS MiB': f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}",
+        'requests/scrape': f"{requests_per_scrape:.1f}",
+        'payload bytes': str(size),
+    }
+
+
+def print_table(rows: list[dict[str, str]]) -> None:
+    columns = list(rows[0].keys())
+    widths = [max(len(column), *[len(row[column]) for row in rows]) for column in columns]
+    print('  '.join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(row[column].rjust(width) for column, width in zip(columns, widths)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Mailman3 exporter scrape benchmark',
+                                     epilog='Arguments after -- are passed to the exporter configuration.')
+    parser.add_argument('--lists', default='10,1000,10000', help='Comma separated numbers of lists to benchmark (default: 10,1000,10000)')
+    parser.add_argument('--domains', type=int, default=10, help='Number of domains (default: 10)')
+    parser.add_argument('--users', type=int, default=1000, help='Number of users (default: 1000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Latency added to every fake Mailman response in seconds (default: 0)')
+    parser.add_argument('--scrapes', type=int, default=20, help='Timed scrapes per scale (default: 20)')
+    parser.add_argument('--http', action='store_true', help='Scrape through the exporter HTTP endpoint instead of the registry')
+    parser.add_argument('exporter_args', nargs='*', help='Exporter arguments, e.g. -- --cache false')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    # Ascending scales keep the process wide max RSS meaningful for each row
+    rows = [run_scale(lists, args) for lists in sorted(int(lists) for lists in args.lists.split(','))]
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
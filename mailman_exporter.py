@@ -7,15 +7,23 @@
 import logging
 import sys
 import signal
+import threading
 import time
-from prometheus_client import start_http_server, CollectorRegistry, ProcessCollector
+# Any prometheus_client import runs its package __init__, which loads its exposition module and with it http.server,
+# socketserver and wsgiref; only the exporter's own server modules are left to each mode to import
+from prometheus_client import CollectorRegistry, ProcessCollector, write_to_textfile
+from prometheus_client.registry import Collector
 from src.collectors.platform_collector import PlatformCollector
 from src.collectors.gc_collector import GCCollector
-from src.config import Config, DEFAULT_WAIT_FOR_MAILMAN_SLEEP_INTERVAL_IN_SECONDS
+from src.collectors.log_collector import LogCollector
+from src.config import Config, DEFAULT_WAIT_FOR_MAILMAN_SLEEP_INTERVAL_IN_SECONDS, CACHE_REFRESH_ON_SCRAPE, RUNTIME_THREADED
 from src.collectors.mailman3_collector import Mailman3Collector
 from src.api import Api
 from time import sleep
 
+# Settings the platform, process and gc collectors are created with
+RUNTIME_COLLECTOR_SETTINGS = {'namespace', 'enable_gc_metrics', 'enable_platform_metrics', 'enable_process_metrics'}
+
 
 def signal_handler(_sig: int, _frame: None) -> None:
     shutdown(1)
@@ -36,30 +44,131 @@ def wait_for_mailman(api: Api, interval_in_seconds: float = DEFAULT_WAIT_FOR_MAI
             sleep(interval_in_seconds)
 
 
-def main() -> None:
-    signal.signal(signal.SIGTERM, signal_handler)
+def create_runtime_collectors(config: Config, registry: CollectorRegistry) -> list[Collector]:
+    collectors = []
+    if config.enable_gc_metrics:
+        collectors.append(GCCollector(namespace=config.namespace, registry=registry))
+    if config.enable_platform_metrics:
+        collectors.append(PlatformCollector(namespace=config.namespace, registry=registry))
+    if config.enable_process_metrics:
+        collectors.append(ProcessCollector(namespace=config.namespace, registry=registry))
+    return collectors
 
-    config = Config()
-    api = Api(config)
 
-    wait_for_mailman(api)
+def create_registry(config: Config) -> tuple[CollectorRegistry, list[Collector]]:
+    registry = CollectorRegistry()
 
-    logging.info('Starting server...')
+    runtime_collectors = create_runtime_collectors(config, registry)
+    if config.enable_log_metrics:
+        LogCollector(config, registry=registry)
+    return registry, runtime_collectors
+
+
+def reload_config(config: Config, registry: CollectorRegistry, runtime_collectors: list[Collector],
+                  mailman3_collector: Mailman3Collector) -> list[Collector]:
+    # Scrapes and refreshes see either the previous or the new config and components, never a mix
+    with mailman3_collector.config_lock.writing():
+        changed = config.reload()
+        if changed & RUNTIME_COLLECTOR_SETTINGS:
+            for collector in runtime_collectors:
+                try:
+                    registry.unregister(collector)
+                except KeyError:
+                    # GCCollector only registers itself on CPython
+                    pass
+            runtime_collectors = create_runtime_collectors(config, registry)
+        if changed:
+            mailman3_collector.reconfigure(changed)
+    return runtime_collectors
+
+
+def write_textfile(config: Config) -> None:
+    # One collection and exit: no server, no waiting for Mailman, no background work
+    config.runtime = RUNTIME_THREADED
+    config.cache_refresh = CACHE_REFRESH_ON_SCRAPE
+    config.queue_trend_window_in_seconds = 0
+    config.crawl_aggregates = []
+    api = Api(config)
     registry = CollectorRegistry()
+    mailman3_collector = Mailman3Collector(api=api, config=config, registry=registry)
+    # Written to a temporary file renamed over the target, the textfile collector never reads a partial file
+    write_to_textfile(config.output_textfile, registry)
+    mailman3_collector.close()
+    api.close()
+
+
+def serve_probes(config: Config) -> None:
+    from src.http_server import start_server
+    from src.probes import ProbePool, load_targets
+
+    if config.enable_asyncio_runtime:
+        logging.warning('Probe targets are collected by the threaded runtime, ignoring --runtime asyncio')
+    signal.signal(signal.SIGHUP, lambda _sig, _frame: logging.warning('Configuration reload is not supported with probe targets'))
+    registry, _ = create_registry(config)
+    probe_pool = ProbePool(load_targets(config.probe_targets, config), config, registry)
+    start_server(config.hostname, config.port, registry, probe_pool=probe_pool, config=config)
+    logging.info(f"Server started on port {config.port}, probing targets on /probe")
+    while True:
+        time.sleep(1)
 
-    if config.enable_gc_metrics:
-        GCCollector(namespace=config.namespace, registry=registry)
-    if config.enable_platform_metrics:
-        PlatformCollector(namespace=config.namespace, registry=registry)
-    if config.enable_process_metrics:
-        ProcessCollector(namespace=config.namespace, registry=registry)
-    Mailman3Collector(api=api, config=config, registry=registry)
 
-    start_http_server(addr=config.hostname, port=config.port, registry=registry)
+def serve_asyncio(config: Config, api: Api) -> None:
+    import asyncio
+    from src.async_runtime import serve
+
+    registry, runtime_collectors = create_registry(config)
+    mailman3_collector = Mailman3Collector(api=api, config=config, registry=registry)
+
+    def reload() -> None:
+        nonlocal runtime_collectors
+        runtime_collectors = reload_config(config, registry, runtime_collectors, mailman3_collector)
+
+    asyncio.run(serve(config, registry, mailman3_collector, DEFAULT_WAIT_FOR_MAILMAN_SLEEP_INTERVAL_IN_SECONDS, reload))
+
+
+def serve_threaded(config: Config, api: Api) -> None:
+    from src.exposition import ExpositionCache
+    from src.http_server import start_server
+
+    logging.info('Starting server...')
+    registry, runtime_collectors = create_registry(config)
+    mailman3_collector = Mailman3Collector(api=api, config=config, registry=registry)
+    # The reload runs on the main thread, which otherwise only sleeps
+    reload_requested = threading.Event()
+    signal.signal(signal.SIGHUP, lambda _sig, _frame: reload_requested.set())
+
+    exposition_cache = None
+    if config.web_prerender:
+        exposition_cache = ExpositionCache(registry, mailman3_collector.expired, lambda: mailman3_collector.cache.generation)
+    # Serve right away, scrapes report mailman3_up 0 and /ready fails until Mailman answers
+    ready = threading.Event()
+    start_server(config.hostname, config.port, registry, exposition_cache=exposition_cache, ready=ready.is_set, config=config)
     logging.info(f"Server started on port {config.port}")
 
+    wait_for_mailman(api)
+    ready.set()
+    logging.info('Mailman is ready')
+
     while True:
-        time.sleep(1)
+        if reload_requested.wait(1):
+            reload_requested.clear()
+            runtime_collectors = reload_config(config, registry, runtime_collectors, mailman3_collector)
+
+
+def main() -> None:
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    config = Config()
+
+    # Each mode imports its own server modules, a textfile run only loads what one collection needs
+    if config.enable_textfile_output:
+        write_textfile(config)
+    elif config.enable_probes:
+        serve_probes(config)
+    elif config.enable_asyncio_runtime:
+        serve_asyncio(config, Api(config))
+    else:
+        serve_threaded(config, Api(config))
 
 
 if __name__ == '__main__':
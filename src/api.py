@@ -1,36 +1,93 @@
-from  requests import get, Response
+from requests import Session, Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
-from typing import Any
+import time
+from typing import Any, Optional
+from src.api_metrics import ApiMetrics
+from src.circuit_breaker import CircuitBreakers
 from src.config import Config
+from src.paging import count_endpoint, lists_walk, run_walk
 
 DEFAULT_RESPONSE = {'status_code': 0}
 
+RETRY_STATUS_CODES = [502, 503, 504]
+
+CIRCUIT_OPEN_STATUS = 503
+
 
 class Api:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, metrics: Optional[ApiMetrics] = None):
         self.config = config
+        self.metrics = metrics if metrics is not None else ApiMetrics(config.prefix)
+        self.circuit_breakers = CircuitBreakers(
+            config.mailman_circuit_threshold,
+            config.mailman_circuit_reset_in_seconds,
+            config.mailman_circuit_reset_max_in_seconds,
+            config.prefix,
+        )
+        self.session = self.create_session()
         url = self.mailman_url('/')
         logging.info(f"Querying Mailman at URL: <{url}>")
 
+    def create_session(self) -> Session:
+        retry = Retry(
+            total=self.config.mailman_retries,
+            backoff_factor=self.config.mailman_retry_backoff_in_seconds,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=['GET'],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_maxsize=self.config.mailman_pool_size, max_retries=retry)
+        session = Session()
+        session.auth = (self.config.mailman_user, self.config.mailman_password)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def close(self) -> None:
+        self.session.close()
+
+    @property
+    def timeout(self) -> tuple[float, float]:
+        return self.config.mailman_connect_timeout_in_seconds, self.config.mailman_read_timeout_in_seconds
+
     def mailman_url(self, uri: str = "") -> str:
         return f"{self.config.mailman_address}/{self.config.mailman_api_version}{uri}"
 
     def make_request(self, name: str, endpoint: str) -> tuple[int, Any]:
         url = self.mailman_url(endpoint)
+        circuit_breaker = self.circuit_breakers.get(name)
+        if not circuit_breaker.allow():
+            logging.debug(f"{name}: circuit open, not querying {url}")
+            return CIRCUIT_OPEN_STATUS, {}
+        start = time.perf_counter()
         try:
-            response = get(url, auth=(self.config.mailman_user, self.config.mailman_password))
+            response: Response = self.session.get(url, timeout=self.timeout)
+            self.metrics.observe_response(name, response.status_code, len(response.content), time.perf_counter() - start)
             if 200 <= response.status_code < 220:
-                return response.status_code, response.json()
+                decode_start = time.perf_counter()
+                resp = response.json()
+                self.metrics.observe_json_decode(name, time.perf_counter() - decode_start)
+                # Recorded once the body decoded, an undecodable answer only counts as a failure
+                circuit_breaker.record(True)
+                return response.status_code, resp
             else:
+                circuit_breaker.record(response.status_code < 500)
                 logging.debug(f"{name}: url {url}")
                 logging.debug(f"{name}: content {response.content[:160]}")
                 return response.status_code, {}
         except Exception as e:
+            circuit_breaker.record(False)
+            self.metrics.observe_exception(name, e, time.perf_counter() - start)
             logging.error(f"{name}(exception): {e}")
             return 500, {}
 
+    def count(self, name: str, endpoint: str) -> tuple[int, Any]:
+        return self.make_request(name, count_endpoint(endpoint))
+
     def usercount(self) -> tuple[int, Any]:
-        return self.make_request('usercount', '/users?count=1&page=1')
+        return self.count('usercount', '/users')
 
     def versions(self) -> tuple[int, Any]:
         return self.make_request('versions', '/system/versions')
@@ -39,7 +96,7 @@ class Api:
         return self.make_request('domains', '/domains')
 
     def lists(self) -> tuple[int, Any]:
-        return self.make_request('lists', '/lists')
+        return run_walk(lists_walk(self.config), self.make_request)
 
     def queues(self) -> tuple[int, Any]:
         return self.make_request('queues', '/queues')
@@ -0,0 +1,43 @@
+from typing import Iterable
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import Metric
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+
+class ApiMetrics:
+    """Wall clock latency and I/O counters of the requests sent to the Mailman REST API."""
+
+    def __init__(self, prefix: str = ''):
+        self.rename(prefix)
+
+    def rename(self, prefix: str) -> None:
+        # Metrics are renamed by replacing them, they start over from zero
+        self.request_duration = Histogram(f"{prefix}mailman3_api_request_duration_seconds",
+                                          'Wall clock duration of Mailman REST API requests',
+                                          labelnames=['endpoint'], buckets=LATENCY_BUCKETS, registry=None)
+        self.responses = Counter(f"{prefix}mailman3_api_responses", 'Mailman REST API responses per HTTP status',
+                                 labelnames=['endpoint', 'status'], registry=None)
+        self.response_bytes = Counter(f"{prefix}mailman3_api_response_bytes", 'Bytes received from the Mailman REST API',
+                                      labelnames=['endpoint'], registry=None)
+        self.json_decode_duration = Counter(f"{prefix}mailman3_api_json_decode_seconds",
+                                            'Time spent decoding Mailman REST API responses',
+                                            labelnames=['endpoint'], registry=None)
+        self.exceptions = Counter(f"{prefix}mailman3_api_exceptions", 'Mailman REST API requests failed with an exception',
+                                  labelnames=['endpoint', 'exception'], registry=None)
+
+    def observe_response(self, endpoint: str, status: int, size: int, duration: float) -> None:
+        self.request_duration.labels(endpoint).observe(duration)
+        self.responses.labels(endpoint, str(status)).inc()
+        self.response_bytes.labels(endpoint).inc(size)
+
+    def observe_exception(self, endpoint: str, exception: BaseException, duration: float) -> None:
+        self.request_duration.labels(endpoint).observe(duration)
+        self.exceptions.labels(endpoint, type(exception).__name__).inc()
+
+    def observe_json_decode(self, endpoint: str, duration: float) -> None:
+        self.json_decode_duration.labels(endpoint).inc(duration)
+
+    def collect(self) -> Iterable[Metric]:
+        for metric in (self.request_duration, self.responses, self.response_bytes, self.json_decode_duration, self.exceptions):
+            yield from metric.collect()
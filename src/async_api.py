@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import ssl
+import time
+from base64 import b64encode
+from typing import Any, Optional
+from urllib.parse import urlsplit
+from src.api import CIRCUIT_OPEN_STATUS, RETRY_STATUS_CODES
+from src.api_metrics import ApiMetrics
+from src.circuit_breaker import CircuitBreakers
+from src.config import Config
+from src.paging import count_endpoint, lists_walk, run_walk_async
+
+USER_AGENT = 'mailman3_exporter'
+
+
+class HTTPError(Exception):
+    pass
+
+
+class AsyncApi:
+    """Mailman REST client multiplexing every request on the running event loop over a keep-alive connection pool."""
+
+    def __init__(self, config: Config, metrics: Optional[ApiMetrics] = None, circuit_breakers: Optional[CircuitBreakers] = None):
+        self.config = config
+        self.metrics = metrics if metrics is not None else ApiMetrics(config.prefix)
+        self.circuit_breakers = circuit_breakers
+        if circuit_breakers is None:
+            self.circuit_breakers = CircuitBreakers(
+                config.mailman_circuit_threshold,
+                config.mailman_circuit_reset_in_seconds,
+                config.mailman_circuit_reset_max_in_seconds,
+                config.prefix,
+            )
+        address = urlsplit(config.mailman_address)
+        self.https = address.scheme == 'https'
+        self.host = address.hostname or 'localhost'
+        self.port = address.port or (443 if self.https else 80)
+        self.host_header = address.netloc.rpartition('@')[2]
+        self.base_path = address.path.rstrip('/')
+        self.ssl_context = ssl.create_default_context() if self.https else None
+        credentials = f"{config.mailman_user}:{config.mailman_password}".encode()
+        self.authorization = f"Basic {b64encode(credentials).decode()}"
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def mailman_path(self, uri: str = "") -> str:
+        return f"{self.base_path}/{self.config.mailman_api_version}{uri}"
+
+    async def close(self) -> None:
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    def backoff(self, attempt: int) -> float:
+        # Same schedule as urllib3's Retry used by the threaded Api
+        return 0 if attempt <= 1 else self.config.mailman_retry_backoff_in_seconds * (2 ** (attempt - 1))
+
+    async def make_request(self, name: str, endpoint: str) -> tuple[int, Any]:
+        path = self.mailman_path(endpoint)
+        circuit_breaker = self.circuit_breakers.get(name)
+        if not circuit_breaker.allow():
+            logging.debug(f"{name}: circuit open, not querying {path}")
+            return CIRCUIT_OPEN_STATUS, {}
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                status, body = await self.get(path)
+                if status not in RETRY_STATUS_CODES or attempt >= self.config.mailman_retries:
+                    break
+            except Exception as e:
+                if attempt >= self.config.mailman_retries:
+                    circuit_breaker.record(False)
+                    self.metrics.observe_exception(name, e, time.perf_counter() - start)
+                    logging.error(f"{name}(exception): {e!r}")
+                    return 500, {}
+            attempt += 1
+            await asyncio.sleep(self.backoff(attempt))
+        self.metrics.observe_response(name, status, len(body), time.perf_counter() - start)
+        if 200 <= status < 220:
+            try:
+                decode_start = time.perf_counter()
+                resp = json.loads(body)
+                self.metrics.observe_json_decode(name, time.perf_counter() - decode_start)
+                # Recorded once the body decoded, an undecodable answer only counts as a failure
+                circuit_breaker.record(True)
+                return status, resp
+            except ValueError as e:
+                circuit_breaker.record(False)
+                self.metrics.observe_exception(name, e, time.perf_counter() - start)
+                logging.error(f"{name}(exception): {e!r}")
+                return 500, {}
+        circuit_breaker.record(status < 500)
+        logging.debug(f"{name}: path {path}")
+        logging.debug(f"{name}: content {body[:160]}")
+        return status, {}
+
+    async def get(self, path: str) -> tuple[int, bytes]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.config.mailman_pool_size)
+        async with self._slots:
+            if self._idle:
+                try:
+                    return await self._exchange(self._idle.pop(), path)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # The server closed the idle keep-alive connection, retry once on a fresh one
+                    pass
+            connection = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=self.ssl_context),
+                self.config.mailman_connect_timeout_in_seconds
+            )
+            return await self._exchange(connection, path)
+
+    async def _exchange(self, connection: tuple[asyncio.StreamReader, asyncio.StreamWriter], path: str) -> tuple[int, bytes]:
+        reader, writer = connection
+        try:
+            writer.write((
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {self.host_header}\r\n"
+                f"Authorization: {self.authorization}\r\n"
+                f"Accept: application/json\r\n"
+                f"User-Agent: {USER_AGENT}\r\n"
+                f"\r\n"
+            ).encode('latin-1'))
+            await writer.drain()
+            status, headers, body = await asyncio.wait_for(self._read_response(reader), self.config.mailman_read_timeout_in_seconds)
+        except BaseException:
+            writer.close()
+            raise
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+        else:
+            self._idle.append(connection)
+        return status, body
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> tuple[int, dict[str, str], bytes]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by server')
+        parts = status_line.decode('latin-1').split(' ', 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise HTTPError(f"malformed status line: {status_line[:80]!r}")
+        version, status = parts[0], int(parts[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        if version == 'HTTP/1.0' and headers.get('connection', '').lower() != 'keep-alive':
+            headers['connection'] = 'close'
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while await reader.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+            return status, headers, bytes(body)
+        if 'content-length' in headers:
+            return status, headers, await reader.readexactly(int(headers['content-length']))
+        headers['connection'] = 'close'
+        return status, headers, await reader.read()
+
+    async def count(self, name: str, endpoint: str) -> tuple[int, Any]:
+        return await self.make_request(name, count_endpoint(endpoint))
+
+    async def usercount(self) -> tuple[int, Any]:
+        return await self.count('usercount', '/users')
+
+    async def versions(self) -> tuple[int, Any]:
+        return await self.make_request('versions', '/system/versions')
+
+    async def domains(self) -> tuple[int, Any]:
+        return await self.make_request('domains', '/domains')
+
+    async def lists(self) -> tuple[int, Any]:
+        return await run_walk_async(lists_walk(self.config), self.make_request)
+
+    async def queues(self) -> tuple[int, Any]:
+        return await self.make_request('queues', '/queues')
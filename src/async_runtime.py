@@ -0,0 +1,252 @@
+import asyncio
+import gzip
+import logging
+import signal
+import time
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import urlsplit
+from prometheus_client.exposition import choose_encoder, gzip_accepted
+from prometheus_client.registry import CollectorRegistry
+from src.async_api import AsyncApi
+from src.collectors.mailman3_collector import Mailman3Collector, COLLECT_KEY
+from src.config import Config
+from src.deadline import SCRAPE_TIMEOUT_HEADER, remaining, scrape_deadline_from
+from src.exposition import ExpositionCache
+from src.http_server import METRICS_PATHS, READY_PATH
+
+MAXIMUM_REQUEST_HEAD_LINES = 100
+
+
+class AsyncCollectorEngine:
+    """Refreshes the Mailman3Collector snapshot from the event loop instead of blocking scrape threads."""
+
+    def __init__(self, api: AsyncApi, collector: Mailman3Collector, config: Config):
+        self.api = api
+        self.collector = collector
+        self.cache = collector.cache
+        self.config = config
+        self._refresh: Optional[asyncio.Task] = None
+        self._pending: dict[str, asyncio.Future] = {}
+
+    def endpoints(self) -> dict[str, Callable[[], Awaitable[tuple[int, Any]]]]:
+        requests = {
+            'domains': self.api.domains,
+            'lists': self.api.lists,
+            'up': self.api.versions,
+            'users': self.api.usercount,
+            'queue': self.api.queues,
+        }
+        if self.cache.queue_scanner is not None:
+            requests['queue'] = lambda: asyncio.to_thread(self.cache.queue_scanner.scan)
+        return {name: requests[name] for name in self.collector.endpoints().keys()}
+
+    async def fetch(self, deadline: Optional[float] = None) -> dict[str, tuple[int, Any]]:
+        # A reload holds the lock while it applies the new config, waiting for it on a thread keeps serving /ready and
+        # the previous snapshot in the meantime
+        lock = self.collector.config_lock
+        acquire = asyncio.ensure_future(asyncio.to_thread(lock.acquire_read))
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # The thread still acquires the lock, release it as soon as it does
+            acquire.add_done_callback(lambda _: lock.release_read())
+            raise
+        try:
+            return await self._fetch(deadline)
+        finally:
+            lock.release_read()
+
+    async def _fetch(self, deadline: Optional[float] = None) -> dict[str, tuple[int, Any]]:
+        endpoints = self.endpoints()
+        slots = asyncio.Semaphore(self.config.collect_concurrency)
+
+        async def fetch_endpoint(name: str, request: Callable[[], Awaitable[tuple[int, Any]]]) -> tuple[int, Any]:
+            async with slots:
+                return await self.cache.get_async(name, request)
+
+        tasks = {}
+        for name, request in endpoints.items():
+            # A request that missed the previous deadline is still running, wait for it instead of sending another
+            task = self._pending.get(name)
+            if task is None or task.done():
+                task = self._pending[name] = asyncio.ensure_future(fetch_endpoint(name, request))
+            tasks[name] = task
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=remaining(deadline))
+        responses, stale = {}, set()
+        for name, task in tasks.items():
+            if task.done():
+                responses[name] = task.result()
+            else:
+                # Late requests still store their response in the cache for the next scrape
+                responses[name] = self.cache.last(name)
+                stale.add(name)
+        self.collector.record_stale(stale)
+        if self.collector.list_probes is not None:
+            # Only queues the next slice, the probes are sent by the collector's threaded client
+            self.collector.refresh_list_probes(responses)
+        if self.config.enable_snapshot_file:
+            # JSON serialisation and fsync block, keep them off the event loop
+            await asyncio.to_thread(self.cache.persist, responses)
+        return responses
+
+    async def refresh(self, deadline: Optional[float] = None) -> None:
+        # Scrapes arriving while a refresh is running wait for that refresh instead of starting another one
+        if self._refresh is None or self._refresh.done():
+            # The fetch itself gives up at the deadline
+            self._refresh = asyncio.create_task(self.cache.refresh_snapshot_async(lambda: self.fetch(deadline)))
+            await asyncio.shield(self._refresh)
+            return
+        self.collector.single_flight.record_coalesced(COLLECT_KEY)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._refresh), remaining(deadline))
+        except asyncio.TimeoutError:
+            # Joined a refresh started with a later deadline, serve the previous snapshot
+            pass
+
+    async def run_refresher(self) -> None:
+        self.cache.enable_background()
+        await self.refresh()
+        # The interval is read on every tick, a configuration reload may change the cache durations
+        next_refresh = time.monotonic() + self.cache.refresh_interval
+        while True:
+            await asyncio.sleep(max(0.0, next_refresh - time.monotonic()))
+            next_refresh += self.cache.refresh_interval
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f"cache refresher(exception): {e}")
+            while next_refresh < time.monotonic():
+                next_refresh += self.cache.refresh_interval
+
+
+class AsyncExporterServer:
+    def __init__(self, config: Config, registry: CollectorRegistry, engine: AsyncCollectorEngine,
+                 exposition_cache: Optional[ExpositionCache] = None):
+        self.config = config
+        self.registry = registry
+        self.engine = engine
+        self.exposition_cache = exposition_cache
+        self.ready = False
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                for _ in range(MAXIMUM_REQUEST_HEAD_LINES):
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    await self.respond(writer, 400, {}, b'')
+                    break
+                method, target, version = parts
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                status, response_headers, body = await self.dispatch(method, target, headers)
+                if not keep_alive:
+                    response_headers['Connection'] = 'close'
+                await self.respond(writer, status, response_headers, body if method != 'HEAD' else b'')
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logging.error(f"http(exception): {e!r}")
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, headers: dict[str, str]) -> tuple[int, dict[str, str], bytes]:
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b''
+        path = urlsplit(target).path
+        if path == READY_PATH:
+            if self.ready:
+                return 200, {'Content-Type': 'text/plain; charset=utf-8'}, b'ready\n'
+            return 503, {'Content-Type': 'text/plain; charset=utf-8'}, b'waiting for mailman\n'
+        if path not in METRICS_PATHS:
+            return 404, {}, b''
+        start = time.perf_counter()
+        if not self.config.enable_background_refresh:
+            await self.engine.refresh(scrape_deadline_from(headers.get(SCRAPE_TIMEOUT_HEADER.lower()), self.config.collect_deadline_in_seconds))
+        # Rendering a large exposition and compressing it would stall every other connection on the loop
+        response = await asyncio.get_running_loop().run_in_executor(None, self.render, headers)
+        self.engine.collector.scrape_duration.observe(time.perf_counter() - start)
+        return response
+
+    def render(self, headers: dict[str, str]) -> tuple[int, dict[str, str], bytes]:
+        accept = headers.get('accept', '')
+        gzipped = gzip_accepted(headers.get('accept-encoding', ''))
+        if self.exposition_cache is not None:
+            exposition = self.exposition_cache.get(accept)
+            response_headers = {'ETag': exposition.etag, 'Vary': 'Accept, Accept-Encoding'}
+            if headers.get('if-none-match') == exposition.etag:
+                return 304, response_headers, b''
+            response_headers['Content-Type'] = exposition.content_type
+            if gzipped:
+                response_headers['Content-Encoding'] = 'gzip'
+                return 200, response_headers, exposition.gzipped_body
+            return 200, response_headers, exposition.body
+        encoder, content_type = choose_encoder(accept)
+        body = encoder(self.registry)
+        response_headers = {'Content-Type': content_type}
+        if gzipped:
+            response_headers['Content-Encoding'] = 'gzip'
+            body = gzip.compress(body)
+        return 200, response_headers, body
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, status: int, headers: dict[str, str], body: bytes) -> None:
+        reason = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                  503: 'Service Unavailable'}.get(status, '')
+        head = [f"HTTP/1.1 {status} {reason}"]
+        head.extend(f"{key}: {value}" for key, value in headers.items())
+        if status != 304:
+            head.append(f"Content-Length: {len(body)}")
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+async def wait_for_mailman(api: AsyncApi, interval_in_seconds: float) -> None:
+    while True:
+        status, resp = await api.versions()
+        if 200 <= status < 220:
+            return
+        logging.info(f"Mailman connection failed, sleeping... (status: {status})")
+        await asyncio.sleep(interval_in_seconds)
+
+
+async def serve(config: Config, registry: CollectorRegistry, collector: Mailman3Collector, wait_interval_in_seconds: float,
+                reload: Optional[Callable[[], None]] = None) -> None:
+    api = AsyncApi(config, collector.api.metrics, collector.api.circuit_breakers)
+    if reload is not None:
+        # The reload waits for the collections in progress, it must not block the loop the refresh runs on
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, lambda: loop.run_in_executor(None, reload))
+    engine = AsyncCollectorEngine(api, collector, config)
+    exposition_cache = None
+    if config.web_prerender:
+        exposition_cache = ExpositionCache(registry, collector.expired, lambda: collector.cache.generation)
+
+    # Serve right away, scrapes report mailman3_up 0 and /ready fails until Mailman answers
+    exporter_server = AsyncExporterServer(config, registry, engine, exposition_cache)
+    server = await asyncio.start_server(exporter_server.handle, config.hostname, config.port)
+    logging.info(f"Server started on port {config.port} (asyncio runtime)")
+    refresher = None
+    try:
+        async with server:
+            await wait_for_mailman(api, wait_interval_in_seconds)
+            exporter_server.ready = True
+            logging.info('Mailman is ready')
+            if config.enable_background_refresh:
+                refresher = asyncio.create_task(engine.run_refresher())
+            await server.serve_forever()
+    finally:
+        if refresher is not None:
+            refresher.cancel()
+        await api.close()
@@ -1,40 +1,269 @@
 import time
 import logging
+import threading
 from src.api import Api
-from typing import Any
+from typing import Any, Awaitable, Callable, Iterable, Optional
 from src.config import Config
+from src.list_store import ListStore
+from src.queue_scanner import QueueScanner
+from src.snapshot_file import load_snapshot, save_snapshot
+
+MINIMUM_REFRESH_INTERVAL_IN_SECONDS = 1
+
+DEADLINE_EXCEEDED_STATUS = 504
+
+
+class CacheEntry:
+    def __init__(self, response: tuple[int, Any], fetched_at: float):
+        self.response = response
+        self.fetched_at = fetched_at
+
+
+class Snapshot:
+    """Responses of every endpoint taken by one background refresh."""
+
+    def __init__(self, responses: dict[str, tuple[int, Any]], refreshed_at: float, refresh_duration: float):
+        self.responses = responses
+        self.refreshed_at = refreshed_at
+        self.refresh_duration = refresh_duration
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.refreshed_at
 
 
 class Cache:
     def __init__(self, api: Api, config: Config):
         self.api = api
         self.config = config
-        self.last_data_refresh_time = 0
-        self.refresh_data = True
 
-        self._domains_status = 0
-        self._domains = []
-        self._lists_status = 0
-        self._lists = []
+        self._entries: dict[str, CacheEntry] = {}
+        self._expiry_margin = 0.0
+        self._stats_lock = threading.Lock()
+        self.hits: dict[str, int] = {}
+        self.misses: dict[str, int] = {}
+        self.generation = 0
+
+        self.queue_scanner = QueueScanner(config.queue_path) if config.enable_queue_scanner else None
+
+        self.latest: dict[str, tuple[int, Any]] = {}
+        self.restored: dict[str, tuple[int, Any]] = {}
+        self.restored_at = 0.0
+        self._persisted: dict[str, tuple[int, Any]] = {}
+        self._persisted_generation = 0
+        self._persisted_at = float('-inf')
+        self._persist_lock = threading.Lock()
+
+        self.snapshot: Optional[Snapshot] = None
+        self.background = False
+        self._refresher: Optional[threading.Thread] = None
+        self._stop_refresher = threading.Event()
 
-    def refresh_time(self):
+    def ttl(self, name: str) -> float:
+        return self.config.cache_durations_in_seconds.get(name, self.config.cache_duration_in_seconds)
+
+    def get(self, name: str, request: Callable[[], tuple[int, Any]]) -> tuple[int, Any]:
         if not self.config.enable_caching:
-            return
+            return self.fallback(name, request())
+        start = time.monotonic()
+        response = self.lookup(name, start)
+        if response is None:
+            response = request()
+            self.store(name, response, start)
+        return self.fallback(name, response)
+
+    async def get_async(self, name: str, request: Callable[[], Awaitable[tuple[int, Any]]]) -> tuple[int, Any]:
+        if not self.config.enable_caching:
+            return self.fallback(name, await request())
+        start = time.monotonic()
+        response = self.lookup(name, start)
+        if response is None:
+            response = await request()
+            self.store(name, response, start)
+        return self.fallback(name, response)
+
+    def fallback(self, name: str, response: tuple[int, Any]) -> tuple[int, Any]:
+        status, _ = response
+        if 200 <= status < 220:
+            self.latest[name] = response
+        # Data restored from the snapshot file is served until Mailman answers for the first time
+        if name not in self.restored:
+            return response
+        if 200 <= status < 220:
+            self.restored.pop(name, None)
+            return response
+        return self.restored.get(name, response)
+
+    def last(self, name: str) -> tuple[int, Any]:
+        # Served in place of an endpoint that missed the scrape deadline, whatever its age. Mailman not answering in
+        # time is what mailman3_up reports, an earlier success is never served for it
+        if name == 'up':
+            return DEADLINE_EXCEEDED_STATUS, {}
+        response = self.latest.get(name) or self.restored.get(name)
+        return response if response is not None else (DEADLINE_EXCEEDED_STATUS, {})
+
+    def lookup(self, name: str, now: float) -> Optional[tuple[int, Any]]:
+        entry = self._entries.get(name)
+        if entry is not None and now - entry.fetched_at + self._expiry_margin < self.ttl(name):
+            self._count(self.hits, name)
+            return entry.response
+        self._count(self.misses, name)
+        logging.debug(f"refresh cache data for {name}")
+        return None
+
+    def store(self, name: str, response: tuple[int, Any], fetched_at: float) -> None:
+        status, _ = response
+        # Failures are never kept, so the next scrape retries instead of reporting them for a whole TTL
+        if 200 <= status < 220:
+            self._entries[name] = CacheEntry(response, fetched_at)
+            self.bump_generation()
+
+    def fetched_at(self, name: str, response: tuple[int, Any]) -> float:
+        # Monotonic time the response was taken from Mailman, a response fetched for this scrape is taken now
+        entry = self._entries.get(name)
+        if entry is not None and entry.response is response:
+            return entry.fetched_at
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.responses.get(name) is response:
+            return snapshot.refreshed_at
+        if self.restored.get(name) is response:
+            return self.restored_at
+        return time.monotonic()
+
+    def invalidate(self, names: Iterable[str]) -> None:
+        # The last known responses stay available as fallbacks, only the cache entries are dropped
+        for name in names:
+            self._entries.pop(name, None)
+
+    def expired(self, names: Iterable[str]) -> bool:
+        if not self.config.enable_caching:
+            return True
+        if self.background:
+            return False
         now = time.monotonic()
-        elapsed_time = now - self.last_data_refresh_time
-        if elapsed_time > self.config.cache_duration_in_seconds:
-            logging.debug("refresh cache data")
-            self.refresh_data = True
-            self.last_data_refresh_time = now
-        else:
-            self.refresh_data = False
+        for name in names:
+            entry = self._entries.get(name)
+            if entry is None or now - entry.fetched_at + self._expiry_margin >= self.ttl(name):
+                return True
+        return False
+
+    def restore(self, names: Iterable[str]) -> None:
+        loaded = load_snapshot(self.config.cache_snapshot_file, self.restore_lists)
+        if loaded is None:
+            return
+        saved_at, responses = loaded
+        age = max(0.0, time.time() - saved_at)
+        self.restored = {name: responses[name] for name in names if name in responses}
+        self.restored_at = time.monotonic() - age
+        self._persisted = dict(self.restored)
+        self.snapshot = Snapshot(dict(self.restored), self.restored_at, 0.0)
+        logging.info(f"Restored {', '.join(self.restored.keys())} from {self.config.cache_snapshot_file} ({age:.0f} seconds old)")
+
+    def restore_lists(self, snapshot: dict[str, Any]) -> ListStore:
+        # Saved lists are filtered again with the current settings
+        return ListStore.from_snapshot(snapshot, include=self.config.lists_include_pattern, exclude=self.config.lists_exclude_pattern,
+                                       shard_index=self.config.shard_index, shard_count=self.config.shard_count)
+
+    def persist(self, responses: dict[str, tuple[int, Any]]) -> None:
+        if not self.config.enable_snapshot_file:
+            return
+        with self._persist_lock:
+            # Cached responses only change along with the cache generation. Without a cache every scrape fetches
+            # new responses, they are saved at most once per cache duration rather than on every scrape
+            generation, now = self.generation, time.monotonic()
+            if self.config.enable_caching:
+                if generation == self._persisted_generation:
+                    return
+            elif now - self._persisted_at < self.refresh_interval:
+                return
+            # Mailman being up is never restored, endpoints that failed keep their previously saved data
+            persisted = dict(self._persisted)
+            for name, response in responses.items():
+                if name != 'up' and 200 <= response[0] < 220:
+                    persisted[name] = response
+            if persisted.keys() == self._persisted.keys() and \
+                    all(response is self._persisted[name] for name, response in persisted.items()):
+                return
+            try:
+                save_snapshot(self.config.cache_snapshot_file, persisted)
+                self._persisted = persisted
+                self._persisted_generation, self._persisted_at = generation, now
+            except (OSError, TypeError, ValueError) as e:
+                logging.error(f"snapshot file(exception): {e}")
+
+    def bump_generation(self) -> None:
+        with self._stats_lock:
+            self.generation += 1
+
+    def _count(self, counters: dict[str, int], name: str) -> None:
+        with self._stats_lock:
+            counters[name] = counters.get(name, 0) + 1
 
     def domains(self) -> tuple[int, Any]:
-        if self.refresh_data:
-            self._domains_status, self._domains = self.api.domains()
-        return self._domains_status, self._domains
+        return self.get('domains', self.api.domains)
 
     def lists(self) -> tuple[int, Any]:
-        if self.refresh_data:
-            self._lists_status, self._lists = self.api.lists()
-        return self._lists_status, self._lists
+        return self.get('lists', self.api.lists)
+
+    def versions(self) -> tuple[int, Any]:
+        return self.get('up', self.api.versions)
+
+    def usercount(self) -> tuple[int, Any]:
+        return self.get('users', self.api.usercount)
+
+    def queues(self) -> tuple[int, Any]:
+        if self.queue_scanner is not None:
+            return self.get('queue', self.queue_scanner.scan)
+        return self.get('queue', self.api.queues)
+
+    @property
+    def refresh_interval(self) -> float:
+        return max(MINIMUM_REFRESH_INTERVAL_IN_SECONDS, min(self.config.cache_durations_in_seconds.values()))
+
+    def enable_background(self) -> None:
+        # The refresher ticks at the shortest TTL; refresh each entry on the tick closest to its expiry
+        # instead of one tick late
+        self._expiry_margin = self.refresh_interval / 2
+        self.background = True
+
+    def start_refresher(self, fetch: Callable[[], dict[str, tuple[int, Any]]]) -> None:
+        self.enable_background()
+        # The first refresh happens on the refresher thread so an unreachable Mailman does not delay startup
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(fetch,), name='mailman3-cache-refresher', daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self) -> None:
+        self._stop_refresher.set()
+
+    def refresh_snapshot(self, fetch: Callable[[], dict[str, tuple[int, Any]]]) -> None:
+        start = time.monotonic()
+        responses = fetch()
+        self.swap_snapshot(responses, start)
+
+    async def refresh_snapshot_async(self, fetch: Callable[[], Awaitable[dict[str, tuple[int, Any]]]]) -> None:
+        start = time.monotonic()
+        responses = await fetch()
+        self.swap_snapshot(responses, start)
+
+    def swap_snapshot(self, responses: dict[str, tuple[int, Any]], start: float) -> None:
+        end = time.monotonic()
+        logging.debug(f"refreshed cache snapshot in {end - start:.3f} seconds")
+        previous = self.snapshot
+        # Replacing the reference is atomic, scrapes see either the previous or the new snapshot
+        self.snapshot = Snapshot(responses, end, end - start)
+        # Responses served from cache entries are the very same objects, anything else is new data
+        if previous is None or responses.keys() != previous.responses.keys() or \
+                any(response is not previous.responses[name] for name, response in responses.items()):
+            self.bump_generation()
+
+    def _refresh_loop(self, fetch: Callable[[], dict[str, tuple[int, Any]]]) -> None:
+        next_refresh = time.monotonic()
+        while not self._stop_refresher.wait(max(0.0, next_refresh - time.monotonic())):
+            next_refresh += self.refresh_interval
+            try:
+                self.refresh_snapshot(fetch)
+            except Exception as e:
+                logging.error(f"cache refresher(exception): {e}")
+            # Skip missed ticks rather than refreshing back to back after a slow refresh
+            while next_refresh < time.monotonic():
+                next_refresh += self.refresh_interval
@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Callable, Iterable
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+
+CLOSED = 0
+OPEN = 1
+HALF_OPEN = 2
+
+
+class CircuitBreaker:
+    """Fails fast after repeated failures, then lets a single probe through once the backoff elapsed."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_reset_timeout: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self.state = CLOSED
+        self.rejections = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def reconfigure(self, failure_threshold: int, reset_timeout: float, max_reset_timeout: float) -> None:
+        with self._lock:
+            self.failure_threshold = failure_threshold
+            self.reset_timeout = reset_timeout
+            self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self._clock() - self._opened_at >= self._timeout:
+                self.state = HALF_OPEN
+                return True
+            self.rejections += 1
+            return False
+
+    def record(self, success: bool) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if success:
+                self.state = CLOSED
+                self._failures = 0
+                self._timeout = self.reset_timeout
+            elif self.state == HALF_OPEN:
+                # The probe failed, wait twice as long before the next one
+                self._open()
+                self._timeout = min(self._timeout * 2, self.max_reset_timeout)
+            else:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = self._clock()
+
+
+class CircuitBreakers:
+    """One circuit breaker per Mailman REST API endpoint."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_reset_timeout: float, prefix: str = '',
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.prefix = prefix
+        self.clock = clock
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def reconfigure(self, failure_threshold: int, reset_timeout: float, max_reset_timeout: float) -> None:
+        # Breakers keep their state, the new thresholds apply from their next failure or probe
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        with self._lock:
+            for breaker in self._breakers.values():
+                breaker.reconfigure(failure_threshold, reset_timeout, max_reset_timeout)
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    endpoint, CircuitBreaker(self.failure_threshold, self.reset_timeout, self.max_reset_timeout, self.clock)
+                )
+        return breaker
+
+    def collect(self) -> Iterable[Metric]:
+        mailman3_api_circuit_state = GaugeMetricFamily(f"{self.prefix}mailman3_api_circuit_state",
+                                                       'Circuit breaker state per endpoint; 0 closed, 1 open, 2 half-open',
+                                                       labels=['endpoint'])
+        mailman3_api_circuit_rejections = CounterMetricFamily(f"{self.prefix}mailman3_api_circuit_rejections",
+                                                              'Requests failed fast because the circuit was open',
+                                                              labels=['endpoint'])
+        for endpoint, breaker in list(self._breakers.items()):
+            mailman3_api_circuit_state.add_metric([endpoint], breaker.state)
+            mailman3_api_circuit_rejections.add_metric([endpoint], breaker.rejections)
+        yield mailman3_api_circuit_state
+        yield mailman3_api_circuit_rejections
@@ -0,0 +1,148 @@
+import logging
+import os
+import re
+import threading
+from typing import Iterable, Iterator
+from prometheus_client.core import CounterMetricFamily, Metric
+from prometheus_client.registry import Collector, CollectorRegistry, REGISTRY
+from src.config import Config
+from src.log_tailer import TailedFile, load_offsets, save_offsets
+
+SMTP_LOG = 'smtp.log'
+BOUNCE_LOG = 'bounce.log'
+MAILMAN_LOG = 'mailman.log'
+
+# Mailman's default [logging.smtp] templates
+SMTP_EVERY = re.compile(r' smtp to (?P<list>\S+) for (?P<recipients>\d+) recips, completed in ')
+SMTP_REFUSED = re.compile(r' post to (?P<list>\S+) from \S+, \d+ bytes, (?P<refused>\d+) failures')
+SMTP_FAILURE = ' failed with code '
+BOUNCE_SCORE = re.compile(r'\) (?P<list>[^\s:]+): \S+ bounce score incremented')
+BOUNCE_UNRECOGNISED = 'w/no discernable addresses'
+RUNNER_EXCEPTION = 'Uncaught runner exception'
+
+
+class LogCollector(Collector):
+    """Delivery and bounce counters parsed from Mailman's log files by a background tailer."""
+
+    def __init__(self, config: Config, registry: CollectorRegistry = REGISTRY):
+        self.config = config
+        offsets = load_offsets(config.logs_state_file) if config.logs_state_file else {}
+        self.files = {
+            name: TailedFile(os.path.join(config.logs_directory, name), *offsets.get(name, (0, -1)))
+            for name in (SMTP_LOG, BOUNCE_LOG, MAILMAN_LOG)
+        }
+        self.lines = {name: 0 for name in self.files.keys()}
+        self.delivered: dict[str, int] = {}
+        self.recipients: dict[str, int] = {}
+        self.refused: dict[str, int] = {}
+        self.smtp_failures = 0
+        self.bounces: dict[str, int] = {}
+        self.unrecognised_bounces = 0
+        self.runner_exceptions = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._tailer = threading.Thread(target=self._tail_loop, name='mailman3-log-tailer', daemon=True)
+        self._tailer.start()
+
+        if registry:
+            registry.register(self)
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def _tail_loop(self) -> None:
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logging.error(f"log tailer(exception): {e}")
+            if self._stop.wait(self.config.logs_interval_in_seconds):
+                break
+        for tailed in self.files.values():
+            tailed.close()
+
+    def poll(self) -> None:
+        offsets = {name: (tailed.inode, tailed.offset) for name, tailed in self.files.items()}
+        for name, tailed in self.files.items():
+            parse = {SMTP_LOG: self.parse_smtp, BOUNCE_LOG: self.parse_bounce, MAILMAN_LOG: self.parse_mailman}[name]
+            for lines in tailed.poll():
+                with self._lock:
+                    self.lines[name] += len(lines)
+                    parse(lines)
+        if self.config.logs_state_file and offsets != {name: (tailed.inode, tailed.offset) for name, tailed in self.files.items()}:
+            try:
+                save_offsets(self.config.logs_state_file, self.files)
+            except OSError as e:
+                logging.error(f"log offsets file(exception): {e}")
+
+    def parse_smtp(self, lines: list[str]) -> None:
+        for line in lines:
+            # Cheap substring tests first, only candidate lines go through a regular expression
+            if ' recips, ' in line:
+                match = SMTP_EVERY.search(line)
+                if match:
+                    mailing_list = match['list']
+                    self.delivered[mailing_list] = self.delivered.get(mailing_list, 0) + 1
+                    self.recipients[mailing_list] = self.recipients.get(mailing_list, 0) + int(match['recipients'])
+            elif ' failures' in line:
+                match = SMTP_REFUSED.search(line)
+                if match:
+                    self.refused[match['list']] = self.refused.get(match['list'], 0) + int(match['refused'])
+            elif SMTP_FAILURE in line:
+                self.smtp_failures += 1
+
+    def parse_bounce(self, lines: list[str]) -> None:
+        for line in lines:
+            if 'bounce score' in line:
+                match = BOUNCE_SCORE.search(line)
+                if match:
+                    self.bounces[match['list']] = self.bounces.get(match['list'], 0) + 1
+            elif BOUNCE_UNRECOGNISED in line:
+                self.unrecognised_bounces += 1
+
+    def parse_mailman(self, lines: list[str]) -> None:
+        for line in lines:
+            if RUNNER_EXCEPTION in line:
+                self.runner_exceptions += 1
+
+    def collect(self) -> Iterable[Metric]:
+        # The families are built under the lock and yielded once it is released, a slow consumer never stalls the tailer
+        with self._lock:
+            families = list(self.families())
+        yield from families
+
+    def families(self) -> Iterator[Metric]:
+        per_list = (
+            ('mailman3_log_messages_delivered', 'Messages delivered per list, from smtp.log', self.delivered),
+            ('mailman3_log_recipients', 'Recipients messages were delivered to per list, from smtp.log', self.recipients),
+            ('mailman3_log_smtp_refused_recipients', 'Recipients refused by the SMTP server per list, from smtp.log', self.refused),
+            ('mailman3_log_bounces', 'Bounces that incremented a member bounce score per list, from bounce.log', self.bounces),
+        )
+        for name, documentation, counts in per_list:
+            family = CounterMetricFamily(f"{self.config.prefix}{name}", documentation, labels=['list'])
+            for mailing_list, count in counts.items():
+                family.add_metric([mailing_list], value=count)
+            yield family
+
+        totals = (
+            ('mailman3_log_smtp_failures', 'Deliveries failed with an SMTP error, from smtp.log', self.smtp_failures),
+            ('mailman3_log_unrecognised_bounces', 'Bounces without a recognisable address, from bounce.log',
+             self.unrecognised_bounces),
+            ('mailman3_log_runner_exceptions', 'Uncaught runner exceptions, from mailman.log', self.runner_exceptions),
+        )
+        for name, documentation, count in totals:
+            family = CounterMetricFamily(f"{self.config.prefix}{name}", documentation)
+            family.add_metric([], value=count)
+            yield family
+
+        lines = CounterMetricFamily(f"{self.config.prefix}mailman3_log_lines", 'Lines read per log file', labels=['log'])
+        rotations = CounterMetricFamily(f"{self.config.prefix}mailman3_log_rotations", 'Rotations followed per log file', labels=['log'])
+        truncations = CounterMetricFamily(f"{self.config.prefix}mailman3_log_truncations", 'Truncations detected per log file',
+                                          labels=['log'])
+        for name, tailed in self.files.items():
+            lines.add_metric([name], value=self.lines[name])
+            rotations.add_metric([name], value=tailed.rotations)
+            truncations.add_metric([name], value=tailed.truncations)
+        yield lines
+        yield rotations
+        yield truncations
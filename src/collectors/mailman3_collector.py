@@ -1,10 +1,32 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from prometheus_client import Histogram
 from prometheus_client.registry import Collector, CollectorRegistry, REGISTRY
-from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily, HistogramMetricFamily
 from src.metric_processing_time import metric_processing_time
 import logging
+from typing import Any, Callable, Iterable, Optional
 from src.api import Api
+from src.api_metrics import LATENCY_BUCKETS
 from src.cache import Cache
 from src.config import Config
+from src.deadline import remaining, scrape_deadline
+from src.list_probes import ListProbes
+from src.list_store import ListStore
+from src.queue_trend import QueueTrends
+from src.read_write_lock import ReadWriteLock
+from src.single_flight import SingleFlight
+from src.users_crawler import UNKNOWN_LANGUAGE, UNSET_LANGUAGE, UsersCrawler
+
+COLLECT_KEY = 'collect'
+
+LIST_PROBE_METRICS = {
+    'owners': ('mailman3_list_owners', 'Number of owners per list'),
+    'moderators': ('mailman3_list_moderators', 'Number of moderators per list'),
+    'nonmembers': ('mailman3_list_nonmembers', 'Number of nonmembers per list'),
+    'held': ('mailman3_list_held_messages', 'Number of messages held for moderation per list'),
+    'requests': ('mailman3_list_subscription_requests', 'Number of pending subscription requests per list'),
+}
 
 
 class Mailman3Collector(Collector):
@@ -13,66 +35,230 @@ class Mailman3Collector(Collector):
         self.api = api
         self.config = config
         self.cache = Cache(api, config)
+        self.single_flight = SingleFlight()
+        # Collections read the config throughout, a reload applies its changes while none is running
+        self.config_lock = ReadWriteLock()
+        self.stale: frozenset[str] = frozenset()
+        self.deadline_exceeded: dict[str, int] = {}
+        self._pending: dict[str, Future] = {}
+        self.scrape_duration = Histogram(f"{config.prefix}mailman3_scrape_duration_seconds", 'Wall clock duration of scrapes',
+                                         buckets=LATENCY_BUCKETS, registry=None)
+        self.list_probes = ListProbes(api, config) if config.enable_list_probes else None
+        self.users_crawler = UsersCrawler(api, config) if config.enable_users_crawler else None
+        if self.users_crawler is not None:
+            self.users_crawler.start()
+        self.queue_trends = QueueTrends(config.queue_trend_window_in_seconds, config.queue_trend_samples)
+        self.executor = None
+        if config.enable_snapshot_file:
+            self.cache.restore(self.endpoints().keys())
+        # The asyncio runtime fetches on its event loop and hands the responses over as cache snapshots
+        if not config.enable_asyncio_runtime:
+            if config.collect_concurrency > 1:
+                self.executor = ThreadPoolExecutor(max_workers=config.collect_concurrency, thread_name_prefix='mailman3-fetch')
+            if config.enable_background_refresh:
+                self.cache.start_refresher(self.refresh_fetch)
 
         if registry:
             registry.register(self)
 
-    def collect_domains(self, processing_time: GaugeMetricFamily) -> None:
+    def reconfigure(self, changed: set[str]) -> None:
+        # The config was changed in place under config_lock.writing(), rebuild only what was sized or named after the
+        # changed settings; the cache, the connection pool and the background threads keep running
+        config = self.config
+        if 'namespace' in changed:
+            self.scrape_duration = Histogram(f"{config.prefix}mailman3_scrape_duration_seconds", 'Wall clock duration of scrapes',
+                                             buckets=LATENCY_BUCKETS, registry=None)
+            self.api.metrics.rename(config.prefix)
+            self.api.circuit_breakers.prefix = config.prefix
+        if changed & {'mailman_circuit_threshold', 'mailman_circuit_reset_in_seconds', 'mailman_circuit_reset_max_in_seconds'}:
+            self.api.circuit_breakers.reconfigure(config.mailman_circuit_threshold, config.mailman_circuit_reset_in_seconds,
+                                                  config.mailman_circuit_reset_max_in_seconds)
+        if changed & {'list_probes', 'list_probes_concurrency'}:
+            if self.list_probes is not None:
+                self.list_probes.close()
+            self.list_probes = ListProbes(self.api, config) if config.enable_list_probes else None
+        # Only the first shard crawls, whichever setting turned the crawler on or off
+        if changed & {'crawl_aggregates', 'crawl_page_size'} or (self.users_crawler is not None) != config.enable_users_crawler:
+            if self.users_crawler is not None:
+                self.users_crawler.close()
+            self.users_crawler = UsersCrawler(self.api, config) if config.enable_users_crawler else None
+            if self.users_crawler is not None:
+                self.users_crawler.start()
+        if changed & {'queue_trend_window_in_seconds', 'queue_trend_samples'}:
+            self.queue_trends = QueueTrends(config.queue_trend_window_in_seconds, config.queue_trend_samples)
+        if changed & {'lists_include', 'lists_exclude', 'shard_index', 'shard_count'}:
+            # The cached lists were filtered with the previous settings
+            self.cache.invalidate(['lists'])
+        if self.cache.background and changed & {'cache_duration_in_seconds', 'cache_durations_in_seconds'}:
+            self.cache.enable_background()
+        # Prerendered metrics are rendered again with the new settings
+        self.cache.bump_generation()
+
+    def close(self) -> None:
+        self.cache.stop_refresher()
+        if self.list_probes is not None:
+            self.list_probes.close()
+        if self.users_crawler is not None:
+            self.users_crawler.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def collect_domains(self, processing_time: GaugeMetricFamily, response: tuple[int, Any]) -> None:
         with metric_processing_time('domains', processing_time):
             mailman3_domains = GaugeMetricFamily(f"{self.config.prefix}mailman3_domains", 'Number of configured list domains')
-            domains_status, domains = self.cache.domains()
+            domains_status, domains = response
             if 200 <= domains_status < 220:
                 mailman3_domains.add_metric(['count'], domains['total_size'])
             else:
                 mailman3_domains.add_metric(['count'], 0)
             yield mailman3_domains
 
-    def collect_lists(self, processing_time: GaugeMetricFamily) -> None:
+    def collect_lists(self, processing_time: GaugeMetricFamily, response: tuple[int, Any]) -> None:
         with metric_processing_time('lists', processing_time):
             mailman3_lists = GaugeMetricFamily(f"{self.config.prefix}mailman3_lists", 'Number of configured lists')
-            no_lists = False
-            lists_status, lists = self.cache.lists()
+            mailman3_list_members = CounterMetricFamily(f"{self.config.prefix}mailman3_list_members", 'Count members per list',
+                                                        labels=['list'])
+            lists_status, lists = response
             if 200 <= lists_status < 220:
-                mailman3_lists.add_metric(['count'], lists['total_size'])
+                mailman3_lists.add_metric(['count'], lists.total_size)
+                if self.config.enable_list_members_metrics:
+                    for fqdn_listname, member_count in lists.top(self.config.lists_top) if self.config.lists_top else lists:
+                        mailman3_list_members.add_metric([fqdn_listname], value=member_count)
             else:
                 mailman3_lists.add_metric(['count'], 0)
-                no_lists = True
-            yield mailman3_lists
-
-            mlabels = ['list']
-            if not no_lists:
-                for e in lists['entries']:
-                    logging.debug("members: label %s" % e['fqdn_listname'])
-                    mlabels.append(e['fqdn_listname'])
-            mailman3_list_members = CounterMetricFamily(f"{self.config.prefix}mailman3_list_members", 'Count members per list',
-                                                        labels=mlabels)
-            if not no_lists:
-                for e in lists['entries']:
-                    logging.debug("members metric %s value %s", e['fqdn_listname'], str(e['member_count']))
-                    mailman3_list_members.add_metric([e['fqdn_listname']], value=e['member_count'])
-            yield mailman3_list_members
-
-    def collect_up(self, processing_time: GaugeMetricFamily) -> None:
+            if self.config.enable_installation_metrics:
+                yield mailman3_lists
+            if self.config.enable_list_members_metrics:
+                yield mailman3_list_members
+
+            if self.config.enable_lists_histogram_metrics or self.config.enable_domain_histogram_metrics:
+                yield from self.collect_list_histograms(lists if 200 <= lists_status < 220 else None)
+
+            # Every shard sees all the lists, the rollups come from the first one only
+            if self.config.enable_domain_rollup_metrics and self.config.enable_installation_metrics:
+                mailman3_domain_members = GaugeMetricFamily(f"{self.config.prefix}mailman3_domain_members",
+                                                            'Sum of the members of the lists of each domain', labels=['domain'])
+                mailman3_domain_lists = GaugeMetricFamily(f"{self.config.prefix}mailman3_domain_lists",
+                                                          'Number of lists per domain', labels=['domain'])
+                if 200 <= lists_status < 220:
+                    for domain, member_count in lists.domain_members.items():
+                        mailman3_domain_members.add_metric([domain], member_count)
+                        mailman3_domain_lists.add_metric([domain], lists.domain_lists[domain])
+                yield mailman3_domain_members
+                yield mailman3_domain_lists
+
+            if self.list_probes is not None:
+                yield from self.collect_list_probes()
+
+    def collect_list_histograms(self, lists: Optional[ListStore]) -> None:
+        # Built from the lists selected by the filters, not only the top N; shards count disjoint lists and their
+        # histograms add up to the installation's
+        buckets = self.config.lists_histogram_buckets
+        bounds = [f"{bound:g}" for bound in buckets] + ['+Inf']
+        if self.config.enable_lists_histogram_metrics:
+            mailman3_list_member_count = HistogramMetricFamily(f"{self.config.prefix}mailman3_list_member_count",
+                                                               'Distribution of the member counts of the lists')
+            if lists is not None:
+                cumulative, total = lists.histogram(buckets)
+                mailman3_list_member_count.add_metric([], list(zip(bounds, cumulative)), total)
+            yield mailman3_list_member_count
+        if self.config.enable_domain_histogram_metrics:
+            mailman3_domain_list_member_count = HistogramMetricFamily(f"{self.config.prefix}mailman3_domain_list_member_count",
+                                                                      'Distribution of the member counts of the lists of each domain',
+                                                                      labels=['domain'])
+            if lists is not None:
+                for domain, (cumulative, total) in lists.domain_histograms(buckets).items():
+                    mailman3_domain_list_member_count.add_metric([domain], list(zip(bounds, cumulative)), total)
+            yield mailman3_domain_list_member_count
+
+    def collect_list_probes(self) -> None:
+        for probe, counts in self.list_probes.counts.items():
+            name, documentation = LIST_PROBE_METRICS[probe]
+            family = GaugeMetricFamily(f"{self.config.prefix}{name}", documentation, labels=['list'])
+            for fqdn_listname, count in list(counts.items()):
+                family.add_metric([fqdn_listname], count)
+            yield family
+        mailman3_list_probe_requests = CounterMetricFamily(f"{self.config.prefix}mailman3_list_probe_requests",
+                                                           'Per-list count requests sent to mailman-core')
+        mailman3_list_probe_requests.add_metric([], value=self.list_probes.requests)
+        yield mailman3_list_probe_requests
+
+    def collect_up(self, processing_time: GaugeMetricFamily, response: tuple[int, Any]) -> None:
         with metric_processing_time('up', processing_time):
             mailman3_up = GaugeMetricFamily(f"{self.config.prefix}mailman3_up", 'Status of mailman-core; 1 if accessible, 0 otherwise')
-            status, resp = self.api.versions()
+            status, resp = response
             if 200 <= status < 220:
                 mailman3_up.add_metric(['up'], 1)
             else:
                 mailman3_up.add_metric(['up'], 0)
             yield mailman3_up
 
-    def collect_users(self, processing_time: GaugeMetricFamily) -> None:
+    def collect_users(self, processing_time: GaugeMetricFamily, response: tuple[int, Any]) -> None:
         with metric_processing_time('users', processing_time):
             mailman3_users = CounterMetricFamily(f"{self.config.prefix}mailman3_users", 'Number of list users recorded in mailman-core')
-            status, resp = self.api.usercount()
+            status, resp = response
             if 200 <= status < 220:
                 mailman3_users.add_metric(['count'], resp['total_size'])
             else:
                 mailman3_users.add_metric(['count'], 0)
             yield mailman3_users
 
-    def collect_queue(self, processing_time: GaugeMetricFamily) -> None:
+    def collect_users_crawler(self) -> None:
+        # Aggregates are exported once the crawl completed a full pass over their collection
+        crawler = self.users_crawler
+        addresses = crawler.aggregates('addresses')
+        if addresses is not None:
+            mailman3_addresses = GaugeMetricFamily(f"{self.config.prefix}mailman3_addresses",
+                                                   'Number of addresses recorded in mailman-core, by verification state',
+                                                   labels=['state'])
+            mailman3_addresses.add_metric(['verified'], addresses['verified'])
+            mailman3_addresses.add_metric(['unverified'], addresses['unverified'])
+            yield mailman3_addresses
+            mailman3_addresses_without_user = GaugeMetricFamily(f"{self.config.prefix}mailman3_addresses_without_user",
+                                                                'Number of addresses not linked to a user')
+            mailman3_addresses_without_user.add_metric([], addresses['without_user'])
+            yield mailman3_addresses_without_user
+        languages = crawler.aggregates('languages')
+        if languages is not None:
+            mailman3_users_language = GaugeMetricFamily(f"{self.config.prefix}mailman3_users_language",
+                                                        f"Number of users per preferred language; {UNSET_LANGUAGE} if they "
+                                                        f"have none, {UNKNOWN_LANGUAGE} if their preferences could not be read",
+                                                        labels=['language'])
+            for language, count in sorted(languages.items()):
+                mailman3_users_language.add_metric([language], count)
+            yield mailman3_users_language
+        memberships = crawler.aggregates('memberships')
+        if memberships is not None:
+            mailman3_users_without_memberships = GaugeMetricFamily(f"{self.config.prefix}mailman3_users_without_memberships",
+                                                                   'Estimated number of users subscribed to no list in any '
+                                                                   'role, the subscribed users are counted by a HyperLogLog '
+                                                                   'within about 1%')
+            mailman3_users_without_memberships.add_metric([], memberships['users_without_memberships'])
+            yield mailman3_users_without_memberships
+
+        mailman3_crawl_passes = CounterMetricFamily(f"{self.config.prefix}mailman3_crawl_passes",
+                                                    'Full passes the crawler completed over the collection of each aggregate',
+                                                    labels=['aggregate'])
+        mailman3_crawl_progress = GaugeMetricFamily(f"{self.config.prefix}mailman3_crawl_progress_ratio",
+                                                    'Share of the collection of each aggregate crawled by the pass in progress',
+                                                    labels=['aggregate'])
+        mailman3_crawl_last_pass = GaugeMetricFamily(f"{self.config.prefix}mailman3_crawl_last_pass_timestamp_seconds",
+                                                     'Unix time the last full pass of each aggregate completed', labels=['aggregate'])
+        for name, crawl in crawler.crawls.items():
+            mailman3_crawl_passes.add_metric([name], value=crawl.passes)
+            crawled = (crawl.page - 1) * self.config.crawl_page_size + crawl.offset
+            mailman3_crawl_progress.add_metric([name], min(1.0, crawled / crawl.total_size) if crawl.total_size else 0.0)
+            if crawl.passes:
+                mailman3_crawl_last_pass.add_metric([name], crawl.completed_at)
+        yield mailman3_crawl_passes
+        yield mailman3_crawl_progress
+        yield mailman3_crawl_last_pass
+        mailman3_crawl_requests = CounterMetricFamily(f"{self.config.prefix}mailman3_crawl_requests",
+                                                      'Requests the crawler sent to mailman-core')
+        mailman3_crawl_requests.add_metric([], value=crawler.requests)
+        yield mailman3_crawl_requests
+
+    def collect_queue(self, processing_time: GaugeMetricFamily, response: tuple[int, Any]) -> None:
         with metric_processing_time('queue', processing_time):
             qlabels = ['queue',
                        "archive", "bad", "bounces", "command",
@@ -82,7 +268,7 @@ class Mailman3Collector(Collector):
             mailman3_queue = GaugeMetricFamily(f"{self.config.prefix}mailman3_queues", 'Queue length for mailman-core internal queues',
                                                labels=qlabels)
             mailman3_queue_status = GaugeMetricFamily(f"{self.config.prefix}mailman3_queues_status", 'HTTP code for queue status request')
-            status, resp = self.api.queues()
+            status, resp = response
             if 200 <= status < 220:
                 for e in resp['entries']:
                     logging.debug("queue metric %s value %s", e['name'], str(e['count']))
@@ -92,30 +278,222 @@ class Mailman3Collector(Collector):
                 mailman3_queue_status.add_metric(['status'], value=status)
             yield mailman3_queue
 
-    def proc_labels(self):
-        labels = [
-            ('up', self.config.enable_up_metrics),
-            ('queue', self.config.enable_queue_metrics),
-            ('domains', self.config.enable_domains_metrics),
-            ('lists', self.config.enable_lists_metrics),
-            ('users', self.config.enable_users_metrics),
-        ]
-        labels = filter(lambda label: label[1] is True, labels)
-        return ['method', *[label[0] for label in labels]]
+            if self.config.enable_queue_scanner:
+                mailman3_queue_oldest_age = GaugeMetricFamily(f"{self.config.prefix}mailman3_queue_oldest_age_seconds",
+                                                              'Seconds since the oldest message of each queue was enqueued',
+                                                              labels=['queue'])
+                if 200 <= status < 220:
+                    now = time.time()
+                    # Entries restored from a snapshot or served as the last known value may come from the REST API
+                    for e in resp['entries']:
+                        if e.get('oldest') is not None:
+                            mailman3_queue_oldest_age.add_metric([e['name']], max(0.0, now - e['oldest']))
+                yield mailman3_queue_oldest_age
+                mailman3_queue_directory_scans = CounterMetricFamily(f"{self.config.prefix}mailman3_queue_directory_scans",
+                                                                     'Queue directories listed because they changed since the last scan')
+                mailman3_queue_directory_scans.add_metric([], value=self.cache.queue_scanner.rescans)
+                yield mailman3_queue_directory_scans
 
-    def collect(self) -> None:
-        processing_time = GaugeMetricFamily(f"{self.config.prefix}processing_time_ms", 'Time taken to collect metrics', labels=self.proc_labels())
+            if self.config.enable_queue_trends:
+                yield from self.collect_queue_trends(response)
 
-        self.cache.refresh_time()
+    def collect_queue_trends(self, response: tuple[int, Any]) -> None:
+        status, resp = response
+        if 200 <= status < 220:
+            # Cached and snapshot responses are sampled at the time Mailman answered, not at the time of the scrape
+            self.queue_trends.observe(resp, self.cache.fetched_at('queue', response))
+        mailman3_queue_growth_rate = GaugeMetricFamily(f"{self.config.prefix}mailman3_queue_growth_rate",
+                                                       'Messages per second each queue grew by over the trend window',
+                                                       labels=['queue'])
+        mailman3_queue_drain_eta = GaugeMetricFamily(f"{self.config.prefix}mailman3_queue_drain_eta_seconds",
+                                                     'Seconds until each queue is empty at its current drain rate; '
+                                                     '+Inf if it is not draining', labels=['queue'])
+        for queue, trend in list(self.queue_trends.trends.items()):
+            growth_rate = trend.growth_rate
+            if growth_rate is None:
+                continue
+            mailman3_queue_growth_rate.add_metric([queue], growth_rate)
+            mailman3_queue_drain_eta.add_metric([queue], trend.drain_eta)
+        yield mailman3_queue_growth_rate
+        yield mailman3_queue_drain_eta
 
-        if self.config.enable_domains_metrics:
-            yield from self.collect_domains(processing_time)
+    def collect_cache(self) -> None:
+        snapshot = self.cache.snapshot
+        mailman3_cache_age = GaugeMetricFamily(f"{self.config.prefix}mailman3_cache_age_seconds",
+                                               'Seconds since the cached Mailman data was last refreshed')
+        mailman3_cache_age.add_metric([], snapshot.age)
+        yield mailman3_cache_age
+        mailman3_cache_refresh_duration = GaugeMetricFamily(f"{self.config.prefix}mailman3_cache_refresh_duration_seconds",
+                                                            'Duration of the last refresh of the cached Mailman data')
+        mailman3_cache_refresh_duration.add_metric([], snapshot.refresh_duration)
+        yield mailman3_cache_refresh_duration
+
+    def collect_cache_stats(self) -> None:
+        mailman3_cache_hits = CounterMetricFamily(f"{self.config.prefix}mailman3_cache_hits", 'Requests served from the cache per endpoint',
+                                                  labels=['endpoint'])
+        mailman3_cache_misses = CounterMetricFamily(f"{self.config.prefix}mailman3_cache_misses",
+                                                    'Requests sent to mailman-core because the cached data expired, per endpoint',
+                                                    labels=['endpoint'])
+        for endpoint in self.config.cache_durations_in_seconds.keys():
+            mailman3_cache_hits.add_metric([endpoint], value=self.cache.hits.get(endpoint, 0))
+            mailman3_cache_misses.add_metric([endpoint], value=self.cache.misses.get(endpoint, 0))
+        yield mailman3_cache_hits
+        yield mailman3_cache_misses
+
+    def collect_restored(self) -> None:
+        mailman3_cache_restored_age = GaugeMetricFamily(f"{self.config.prefix}mailman3_cache_restored_age_seconds",
+                                                        'Age of the data restored from the snapshot file, per endpoint still '
+                                                        'served from it', labels=['endpoint'])
+        for endpoint in list(self.cache.restored.keys()):
+            mailman3_cache_restored_age.add_metric([endpoint], time.monotonic() - self.cache.restored_at)
+        yield mailman3_cache_restored_age
+
+    def endpoints(self) -> dict[str, Callable[[], tuple[int, Any]]]:
+        endpoints = {}
+        installation = self.config.enable_installation_metrics
+        if self.config.enable_domains_metrics and installation:
+            endpoints['domains'] = self.cache.domains
         if self.config.enable_lists_metrics:
-            yield from self.collect_lists(processing_time)
-        if self.config.enable_up_metrics:
-            yield from self.collect_up(processing_time)
-        if self.config.enable_users_metrics:
-            yield from self.collect_users(processing_time)
-        if self.config.enable_queue_metrics:
-            yield from self.collect_queue(processing_time)
+            endpoints['lists'] = self.cache.lists
+        if self.config.enable_up_metrics and installation:
+            endpoints['up'] = self.cache.versions
+        if self.config.enable_users_metrics and installation:
+            endpoints['users'] = self.cache.usercount
+        if self.config.enable_queue_metrics and installation:
+            endpoints['queue'] = self.cache.queues
+        return endpoints
+
+    def expired(self) -> bool:
+        return self.cache.expired(self.endpoints().keys())
+
+    def fetch(self, deadline: Optional[float] = None) -> dict[str, tuple[int, Any]]:
+        endpoints = self.endpoints()
+        responses, stale = {}, set()
+        if self.executor is None:
+            for name, request in endpoints.items():
+                # Sequential requests cannot be abandoned, the ones not started before the deadline are skipped
+                if remaining(deadline) == 0:
+                    responses[name] = self.cache.last(name)
+                    stale.add(name)
+                else:
+                    responses[name] = request()
+        else:
+            futures = {}
+            for name, request in endpoints.items():
+                # A request that missed the previous deadline is still running, wait for it instead of sending another
+                future = self._pending.get(name)
+                if future is None or future.done():
+                    future = self._pending[name] = self.executor.submit(request)
+                futures[name] = future
+            wait(futures.values(), timeout=remaining(deadline))
+            for name, future in futures.items():
+                if future.done():
+                    responses[name] = future.result()
+                else:
+                    # Late requests still store their response in the cache for the next scrape
+                    responses[name] = self.cache.last(name)
+                    stale.add(name)
+        self.record_stale(stale)
+        self.refresh_list_probes(responses)
+        self.cache.persist(responses)
+        return responses
+
+    def refresh_fetch(self) -> dict[str, tuple[int, Any]]:
+        # The background refresh reads the config like a scrape does
+        with self.config_lock.reading():
+            return self.fetch()
+
+    def refresh_list_probes(self, responses: dict[str, tuple[int, Any]]) -> None:
+        if self.list_probes is None or 'lists' not in responses:
+            return
+        status, lists = responses['lists']
+        if not 200 <= status < 220:
+            return
+        # Only the lists whose series are exported are probed
+        if self.config.lists_top:
+            fqdn_listnames = [fqdn_listname for fqdn_listname, _ in lists.top(self.config.lists_top)]
+        else:
+            fqdn_listnames = lists.names
+        self.list_probes.refresh(fqdn_listnames)
+
+    def record_stale(self, stale: Iterable[str]) -> None:
+        self.stale = frozenset(stale)
+        self.record_deadline_exceeded(self.stale)
+
+    def record_deadline_exceeded(self, stale: Iterable[str]) -> None:
+        for name in stale:
+            logging.warning(f"{name}: scrape deadline exceeded, serving the last known value")
+            self.deadline_exceeded[name] = self.deadline_exceeded.get(name, 0) + 1
+
+    def collect_staleness(self, stale: frozenset[str]) -> None:
+        mailman3_stale = GaugeMetricFamily(f"{self.config.prefix}mailman3_stale",
+                                           'Whether each endpoint was served from its last known value because it missed '
+                                           'the scrape deadline', labels=['endpoint'])
+        mailman3_deadline_exceeded = CounterMetricFamily(f"{self.config.prefix}mailman3_deadline_exceeded",
+                                                         'Scrapes each endpoint missed the deadline of', labels=['endpoint'])
+        for endpoint in self.endpoints().keys():
+            mailman3_stale.add_metric([endpoint], int(endpoint in stale))
+            mailman3_deadline_exceeded.add_metric([endpoint], value=self.deadline_exceeded.get(endpoint, 0))
+        yield mailman3_stale
+        yield mailman3_deadline_exceeded
+
+    def collect(self) -> None:
+        start = time.perf_counter()
+        # Every family of a scrape is built from the same config, the lock is released before they are yielded
+        with self.config_lock.reading():
+            # Overlapping scrapes share the result of the collection already in progress, up to their own deadline
+            metrics = self.single_flight.do(COLLECT_KEY, lambda: list(self.collect_mailman3()),
+                                            timeout=remaining(scrape_deadline.get()),
+                                            fallback=lambda: list(self.collect_mailman3(last_known=True)))
+            # The asyncio runtime fetches before rendering and observes the whole scrape itself
+            if not self.config.enable_asyncio_runtime:
+                self.scrape_duration.observe(time.perf_counter() - start)
+            # The coalesced scrapes share the list of metrics, each one adds its own families to a copy
+            metrics = [*metrics, *self.scrape_duration.collect(), *self.api.metrics.collect(),
+                       *self.api.circuit_breakers.collect()]
+            mailman3_scrapes_coalesced = CounterMetricFamily(f"{self.config.prefix}mailman3_scrapes_coalesced",
+                                                             'Scrapes answered with the result of a collection already in progress')
+            mailman3_scrapes_coalesced.add_metric([], value=self.single_flight.coalesced.get(COLLECT_KEY, 0))
+            metrics.append(mailman3_scrapes_coalesced)
+        yield from metrics
+
+    def collect_mailman3(self, last_known: bool = False) -> None:
+        processing_time = GaugeMetricFamily(f"{self.config.prefix}processing_time_ms", 'CPU time taken to build the metrics of each method',
+                                            labels=['method'])
+
+        stale = self.stale
+        if last_known:
+            # The collection in progress missed this scrape's deadline, every endpoint is served from its last known value
+            responses = {name: self.cache.last(name) for name in self.endpoints().keys()}
+            stale = frozenset(responses.keys())
+            self.record_deadline_exceeded(stale)
+        elif self.config.enable_background_refresh or self.config.enable_asyncio_runtime:
+            responses = {}
+            if self.cache.snapshot is not None:
+                responses = self.cache.snapshot.responses
+                yield from self.collect_cache()
+            if 'up' in self.endpoints() and 'up' not in responses:
+                # Nothing fetched yet, Mailman has not answered since startup
+                responses = {**responses, 'up': (0, {})}
+        else:
+            responses = self.fetch(scrape_deadline.get())
+            stale = self.stale
+        yield from self.collect_staleness(stale)
+        if self.config.enable_caching:
+            yield from self.collect_cache_stats()
+        if self.config.enable_snapshot_file:
+            yield from self.collect_restored()
+
+        if 'domains' in responses:
+            yield from self.collect_domains(processing_time, responses['domains'])
+        if 'lists' in responses:
+            yield from self.collect_lists(processing_time, responses['lists'])
+        if 'up' in responses:
+            yield from self.collect_up(processing_time, responses['up'])
+        if 'users' in responses:
+            yield from self.collect_users(processing_time, responses['users'])
+        if 'queue' in responses:
+            yield from self.collect_queue(processing_time, responses['queue'])
+        if self.users_crawler is not None:
+            yield from self.collect_users_crawler()
         yield processing_time
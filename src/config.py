@@ -1,15 +1,66 @@
 from argparse import ArgumentParser
+import copy
 import logging
+import math
+import os
 import re
+from os import environ
+from typing import Optional
+from src.options.option import Arguments
 from src.options.choices_option import ChoicesOption
 from src.options.boolean_option import BooleanOption
 from src.options.string_option import StringOption
 from src.options.integer_option import IntegerOption
+from src.options.float_option import FloatOption
 
 DEFAULT_MAILMAN_API_VERSION = "3.1"
 
 DEFAULT_WAIT_FOR_MAILMAN_SLEEP_INTERVAL_IN_SECONDS = 1
 
+RUNTIME_THREADED = 'threaded'
+RUNTIME_ASYNCIO = 'asyncio'
+
+LIST_PROBE_NAMES = ['owners', 'moderators', 'nonmembers', 'held', 'requests']
+CRAWL_AGGREGATE_NAMES = ['addresses', 'languages', 'memberships']
+
+QUEUE_BACKEND_REST = 'rest'
+QUEUE_BACKEND_FILESYSTEM = 'filesystem'
+
+CACHE_REFRESH_ON_SCRAPE = 'scrape'
+CACHE_REFRESH_IN_BACKGROUND = 'background'
+
+# Settings sizing or starting long-lived resources; a reload keeps their running value
+RESTART_SETTINGS = frozenset([
+    'runtime', 'hostname', 'port', 'web_prerender', 'output_textfile', 'probe_targets', 'probe_idle_timeout_in_seconds',
+    'mailman_address', 'mailman_user', 'mailman_password', 'mailman_pool_size', 'mailman_retries',
+    'mailman_retry_backoff_in_seconds', 'enable_caching', 'cache_refresh', 'collect_concurrency', 'queue_backend',
+    'queue_path', 'logs_directory', 'logs_state_file', 'config_file', 'argv',
+])
+
+
+def parse_config_file(config_file: str) -> dict[str, str]:
+    # Environment file syntax: NAME=value lines, blank lines and comments are skipped
+    try:
+        with open(config_file) as f:
+            lines = f.read().splitlines()
+    except OSError as e:
+        logging.error(f"Cannot read the configuration file (got '{config_file}'): {e}")
+        raise ValueError(f"cannot read the configuration file (got '{config_file}'): {e}")
+    environment = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        name, separator, value = line.removeprefix('export ').partition('=')
+        if not separator:
+            logging.error(f"Invalid configuration file line, expected NAME=value (got '{line}')")
+            raise ValueError(f"invalid configuration file line, expected NAME=value (got '{line}')")
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+            value = value[1:-1]
+        environment[name.strip()] = value
+    return environment
+
 
 def parse_host_port(web_listen: str, default_hostname: str = 'localhost', default_port: int = 9934) -> tuple[str, int]:
     uri_info = re.split(r':', web_listen)
@@ -29,8 +80,54 @@ def parse_host_port(web_listen: str, default_hostname: str = 'localhost', defaul
     return hostname, port
 
 
+def parse_list_probes(list_probes: str) -> list[str]:
+    probes = [probe.strip() for probe in list_probes.split(',') if probe.strip()]
+    unknown = [probe for probe in probes if probe not in LIST_PROBE_NAMES]
+    if unknown:
+        logging.error(f"Unknown list probes (got '{', '.join(unknown)}')")
+        raise ValueError(f"unknown list probes (got '{', '.join(unknown)}')")
+    return probes
+
+
+def parse_crawl_aggregates(crawl_aggregates: str) -> list[str]:
+    aggregates = [aggregate.strip() for aggregate in crawl_aggregates.split(',') if aggregate.strip()]
+    unknown = [aggregate for aggregate in aggregates if aggregate not in CRAWL_AGGREGATE_NAMES]
+    if unknown:
+        logging.error(f"Unknown crawl aggregates (got '{', '.join(unknown)}')")
+        raise ValueError(f"unknown crawl aggregates (got '{', '.join(unknown)}')")
+    return aggregates
+
+
+def parse_shard(shard_index: int, shard_count: int) -> tuple[int, int]:
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        logging.error(f"Shard index must be between 0 and the shard count minus one (got {shard_index}/{shard_count})")
+        raise ValueError(f"shard index must be between 0 and the shard count minus one (got {shard_index}/{shard_count})")
+    return shard_index, shard_count
+
+
+def parse_buckets(buckets: str) -> tuple[float, ...]:
+    try:
+        bounds = sorted({float(bound) for bound in buckets.split(',') if bound.strip()})
+        if any(math.isnan(bound) for bound in bounds):
+            raise ValueError
+    except ValueError:
+        logging.error(f"Histogram buckets must be comma separated numbers (got '{buckets}')")
+        raise ValueError(f"histogram buckets must be comma separated numbers (got '{buckets}')")
+    return tuple(bound for bound in bounds if bound != float('inf'))
+
+
+def parse_pattern(pattern: str) -> Optional[re.Pattern]:
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        logging.error(f"Invalid regular expression (got '{pattern}'): {e}")
+        raise ValueError(f"invalid regular expression (got '{pattern}'): {e}")
+
+
 class Config:
-    def __init__(self):
+    def __init__(self, argv: Optional[list[str]] = None):
         log_format = '[%(asctime)s] %(name)s.%(levelname)s %(threadName)s %(message)s'
         log_handler = logging.StreamHandler()
         log_handler.setFormatter(logging.Formatter(log_format))
@@ -55,6 +152,25 @@ class Config:
                       f"Can be used for debugging purposes. (default: false)",
             name_and_flags=['--log-config']
         )
+        config_file_option = StringOption(
+            parser=parser,
+            name='config_file',
+            default_value='',
+            env_var_name='ME_CONFIG_FILE',
+            help_text=f"File of ME_* NAME=value lines for the variables not set in the environment, read again on "
+                      f"SIGHUP (default: none)",
+            name_and_flags=['--config.file']
+        )
+        runtime_option = ChoicesOption(
+            parser=parser,
+            name='runtime',
+            choices=[RUNTIME_THREADED, RUNTIME_ASYNCIO],
+            default_value=RUNTIME_THREADED,
+            env_var_name='ME_RUNTIME',
+            help_text=f"Serve scrapes and query Mailman with a thread per request or on a single asyncio event loop "
+                      f"(default: {RUNTIME_THREADED})",
+            name_and_flags=['--runtime']
+        )
         web_listen_option = StringOption(
             parser=parser,
             name='web_listen',
@@ -63,6 +179,25 @@ class Config:
             help_text=f"HTTPServer metrics listen address (default: localhost:9934)",
             name_and_flags=['--web.listen']
         )
+        web_prerender_option = BooleanOption(
+            parser=parser,
+            name='web_prerender',
+            default_value=False,
+            env_var_name='ME_WEB_PRERENDER',
+            help_text="Render the metrics once per data refresh and serve the stored (gzip compressed) payload with "
+                      f"an ETag; platform, process and gc metrics only change when Mailman data is refreshed "
+                      f"(default: false)",
+            name_and_flags=['--web.prerender']
+        )
+        output_textfile_option = StringOption(
+            parser=parser,
+            name='output_textfile',
+            default_value='',
+            env_var_name='ME_OUTPUT_TEXTFILE',
+            help_text=f"Collect once, write the metrics to this file for node_exporter's textfile collector and exit, "
+                      f"instead of serving them over HTTP (default: disabled)",
+            name_and_flags=['--output.textfile']
+        )
         mailman_address_option = StringOption(
             parser=parser,
             name='mailman_address',
@@ -87,6 +222,98 @@ class Config:
             help_text=f"Mailman3 Core REST API password (default: restpass)",
             name_and_flags=['-p', '--mailman.password']
         )
+        mailman_connect_timeout_option = FloatOption(
+            parser=parser,
+            name='mailman_connect_timeout',
+            default_value=5.0,
+            env_var_name='ME_MAILMAN_CONNECT_TIMEOUT_IN_SECONDS',
+            help_text=f"Mailman3 Core REST API connect timeout in seconds (default: 5)",
+            name_and_flags=['--mailman.timeout.connect']
+        )
+        mailman_read_timeout_option = FloatOption(
+            parser=parser,
+            name='mailman_read_timeout',
+            default_value=30.0,
+            env_var_name='ME_MAILMAN_READ_TIMEOUT_IN_SECONDS',
+            help_text=f"Mailman3 Core REST API read timeout in seconds (default: 30)",
+            name_and_flags=['--mailman.timeout.read']
+        )
+        mailman_pool_size_option = IntegerOption(
+            parser=parser,
+            name='mailman_pool_size',
+            default_value=10,
+            env_var_name='ME_MAILMAN_POOL_SIZE',
+            help_text=f"Number of keep-alive connections kept open to the Mailman3 Core REST API (default: 10)",
+            name_and_flags=['--mailman.pool.size']
+        )
+        mailman_retries_option = IntegerOption(
+            parser=parser,
+            name='mailman_retries',
+            default_value=2,
+            env_var_name='ME_MAILMAN_RETRIES',
+            help_text=f"Number of retries for failed Mailman3 Core REST API requests (default: 2)",
+            name_and_flags=['--mailman.retries']
+        )
+        mailman_retry_backoff_option = FloatOption(
+            parser=parser,
+            name='mailman_retry_backoff',
+            default_value=0.5,
+            env_var_name='ME_MAILMAN_RETRY_BACKOFF_IN_SECONDS',
+            help_text=f"Backoff factor in seconds between Mailman3 Core REST API retries (default: 0.5)",
+            name_and_flags=['--mailman.retry.backoff']
+        )
+        mailman_circuit_threshold_option = IntegerOption(
+            parser=parser,
+            name='mailman_circuit_threshold',
+            default_value=3,
+            env_var_name='ME_MAILMAN_CIRCUIT_THRESHOLD',
+            help_text=f"Consecutive failures of a Mailman3 Core REST API endpoint after which its requests fail fast; "
+                      f"0 disables the circuit breaker (default: 3)",
+            name_and_flags=['--mailman.circuit.threshold']
+        )
+        mailman_circuit_reset_option = FloatOption(
+            parser=parser,
+            name='mailman_circuit_reset',
+            default_value=5.0,
+            env_var_name='ME_MAILMAN_CIRCUIT_RESET_IN_SECONDS',
+            help_text=f"Seconds before an open circuit lets a probe request through (default: 5)",
+            name_and_flags=['--mailman.circuit.reset']
+        )
+        mailman_circuit_reset_max_option = FloatOption(
+            parser=parser,
+            name='mailman_circuit_reset_max',
+            default_value=60.0,
+            env_var_name='ME_MAILMAN_CIRCUIT_RESET_MAX_IN_SECONDS',
+            help_text=f"Upper bound of the probe backoff, doubled after every failed probe (default: 60)",
+            name_and_flags=['--mailman.circuit.reset.max']
+        )
+        mailman_page_size_option = IntegerOption(
+            parser=parser,
+            name='mailman_page_size',
+            default_value=500,
+            env_var_name='ME_MAILMAN_PAGE_SIZE',
+            help_text=f"Number of entries requested per page when paging through Mailman3 Core REST API collections "
+                      f"(default: 500)",
+            name_and_flags=['--mailman.page.size']
+        )
+        probe_targets_option = StringOption(
+            parser=parser,
+            name='probe_targets',
+            default_value='',
+            env_var_name='ME_PROBE_TARGETS_FILE',
+            help_text=f"Targets file enabling the multi-target /probe?target=<name> endpoint; each section names a "
+                      f"target and sets its address, user and password (default: <empty>)",
+            name_and_flags=['--probe.targets']
+        )
+        probe_idle_timeout_option = IntegerOption(
+            parser=parser,
+            name='probe_idle_timeout',
+            default_value=600,
+            env_var_name='ME_PROBE_IDLE_TIMEOUT_IN_SECONDS',
+            help_text=f"Seconds after which a probe target that was not scraped releases its connections and cache "
+                      f"(default: 600)",
+            name_and_flags=['--probe.idle.timeout']
+        )
         namespace_option = StringOption(
             parser=parser,
             name='namespace',
@@ -111,6 +338,270 @@ class Config:
             help_text=f"Cache duration in seconds (default: 30)",
             name_and_flags=['--cache.duration']
         )
+        cache_duration_domains_option = IntegerOption(
+            parser=parser,
+            name='cache_duration_domains',
+            default_value=-1,
+            env_var_name='ME_CACHE_DURATION_DOMAINS_IN_SECONDS',
+            help_text=f"Cache duration in seconds for domains metrics data (default: cache duration)",
+            name_and_flags=['--cache.duration.domains']
+        )
+        cache_duration_lists_option = IntegerOption(
+            parser=parser,
+            name='cache_duration_lists',
+            default_value=-1,
+            env_var_name='ME_CACHE_DURATION_LISTS_IN_SECONDS',
+            help_text=f"Cache duration in seconds for lists metrics data (default: cache duration)",
+            name_and_flags=['--cache.duration.lists']
+        )
+        cache_duration_up_option = IntegerOption(
+            parser=parser,
+            name='cache_duration_up',
+            default_value=-1,
+            env_var_name='ME_CACHE_DURATION_UP_IN_SECONDS',
+            help_text=f"Cache duration in seconds for up metrics data (default: cache duration)",
+            name_and_flags=['--cache.duration.up']
+        )
+        cache_duration_users_option = IntegerOption(
+            parser=parser,
+            name='cache_duration_users',
+            default_value=-1,
+            env_var_name='ME_CACHE_DURATION_USERS_IN_SECONDS',
+            help_text=f"Cache duration in seconds for users metrics data (default: cache duration)",
+            name_and_flags=['--cache.duration.users']
+        )
+        cache_duration_queue_option = IntegerOption(
+            parser=parser,
+            name='cache_duration_queue',
+            default_value=-1,
+            env_var_name='ME_CACHE_DURATION_QUEUE_IN_SECONDS',
+            help_text=f"Cache duration in seconds for queue metrics data (default: cache duration)",
+            name_and_flags=['--cache.duration.queue']
+        )
+        cache_refresh_option = ChoicesOption(
+            parser=parser,
+            name='cache_refresh',
+            choices=[CACHE_REFRESH_ON_SCRAPE, CACHE_REFRESH_IN_BACKGROUND],
+            default_value=CACHE_REFRESH_ON_SCRAPE,
+            env_var_name='ME_CACHE_REFRESH',
+            help_text=f"When cached data is refreshed: during the first scrape after it expired, or by a background "
+                      f"worker every cache duration so scrapes never wait on Mailman (default: {CACHE_REFRESH_ON_SCRAPE})",
+            name_and_flags=['--cache.refresh']
+        )
+        collect_deadline_option = FloatOption(
+            parser=parser,
+            name='collect_deadline',
+            default_value=0.0,
+            env_var_name='ME_COLLECT_DEADLINE_IN_SECONDS',
+            help_text=f"Seconds a scrape waits for Mailman when Prometheus does not send its scrape timeout; endpoints "
+                      f"still pending are served from their last value, except mailman3_up which reports 0. 0 waits as long as it "
+                      f"takes (default: 0)",
+            name_and_flags=['--collect.deadline']
+        )
+        cache_snapshot_file_option = StringOption(
+            parser=parser,
+            name='cache_snapshot_file',
+            default_value='',
+            env_var_name='ME_CACHE_SNAPSHOT_FILE',
+            help_text=f"File the Mailman data is saved to after every refresh and restored from at startup, "
+                      f"so a restarted exporter serves metrics before its first refresh (default: disabled)",
+            name_and_flags=['--cache.snapshot']
+        )
+        collect_concurrency_option = IntegerOption(
+            parser=parser,
+            name='collect_concurrency',
+            default_value=5,
+            env_var_name='ME_COLLECT_CONCURRENCY',
+            help_text=f"Maximum number of Mailman3 Core REST API requests issued in parallel per scrape; "
+                      f"1 fetches sequentially (default: 5)",
+            name_and_flags=['--collect.concurrency']
+        )
+        queue_backend_option = ChoicesOption(
+            parser=parser,
+            name='queue_backend',
+            choices=[QUEUE_BACKEND_REST, QUEUE_BACKEND_FILESYSTEM],
+            default_value=QUEUE_BACKEND_REST,
+            env_var_name='ME_QUEUE_BACKEND',
+            help_text=f"Where queue lengths come from: the Mailman3 Core REST API, or counting the messages in the "
+                      f"queue directories when the exporter runs next to mailman-core (default: {QUEUE_BACKEND_REST})",
+            name_and_flags=['--queue.backend']
+        )
+        queue_path_option = StringOption(
+            parser=parser,
+            name='queue_path',
+            default_value='/var/lib/mailman/queue',
+            env_var_name='ME_QUEUE_PATH',
+            help_text=f"Mailman queue directory read by the filesystem queue backend (default: /var/lib/mailman/queue)",
+            name_and_flags=['--queue.path']
+        )
+        queue_trend_window_option = FloatOption(
+            parser=parser,
+            name='queue_trend_window',
+            default_value=600.0,
+            env_var_name='ME_QUEUE_TREND_WINDOW_IN_SECONDS',
+            help_text=f"Window in seconds of the queue samples the growth rate and drain ETA are fitted on; "
+                      f"0 disables queue trends (default: 600)",
+            name_and_flags=['--queue.trend.window']
+        )
+        queue_trend_samples_option = IntegerOption(
+            parser=parser,
+            name='queue_trend_samples',
+            default_value=120,
+            env_var_name='ME_QUEUE_TREND_SAMPLES',
+            help_text=f"Maximum number of samples kept per queue for its trend (default: 120)",
+            name_and_flags=['--queue.trend.samples']
+        )
+        logs_directory_option = StringOption(
+            parser=parser,
+            name='logs_directory',
+            default_value='',
+            env_var_name='ME_LOGS_DIRECTORY',
+            help_text=f"Mailman log directory to tail smtp.log, bounce.log and mailman.log from for delivery and bounce "
+                      f"counters (default: disabled)",
+            name_and_flags=['--logs.directory']
+        )
+        logs_state_file_option = StringOption(
+            parser=parser,
+            name='logs_state_file',
+            default_value='',
+            env_var_name='ME_LOGS_STATE_FILE',
+            help_text=f"File the log read offsets are saved to, so a restarted exporter resumes where it stopped "
+                      f"(default: start at the end of the logs)",
+            name_and_flags=['--logs.state']
+        )
+        logs_interval_option = FloatOption(
+            parser=parser,
+            name='logs_interval',
+            default_value=5.0,
+            env_var_name='ME_LOGS_INTERVAL_IN_SECONDS',
+            help_text=f"Seconds between two reads of the log files (default: 5)",
+            name_and_flags=['--logs.interval']
+        )
+        list_probes_option = StringOption(
+            parser=parser,
+            name='list_probes',
+            default_value='',
+            env_var_name='ME_LIST_PROBES',
+            help_text=f"Comma separated per-list counts to collect, among owners, moderators, nonmembers, held and "
+                      f"requests (default: none)",
+            name_and_flags=['--lists.probes']
+        )
+        list_probes_budget_option = IntegerOption(
+            parser=parser,
+            name='list_probes_budget',
+            default_value=100,
+            env_var_name='ME_LIST_PROBES_BUDGET',
+            help_text=f"Maximum number of per-list count requests per refresh, the lists are probed round-robin "
+                      f"(default: 100)",
+            name_and_flags=['--lists.probes.budget']
+        )
+        list_probes_concurrency_option = IntegerOption(
+            parser=parser,
+            name='list_probes_concurrency',
+            default_value=4,
+            env_var_name='ME_LIST_PROBES_CONCURRENCY',
+            help_text=f"Maximum number of per-list count requests issued in parallel (default: 4)",
+            name_and_flags=['--lists.probes.concurrency']
+        )
+        crawl_aggregates_option = StringOption(
+            parser=parser,
+            name='crawl_aggregates',
+            default_value='',
+            env_var_name='ME_CRAWL_AGGREGATES',
+            help_text=f"Comma separated aggregates maintained by crawling the users, addresses and members in the "
+                      f"background, among addresses, languages and memberships (default: none)",
+            name_and_flags=['--crawl.aggregates']
+        )
+        crawl_interval_option = FloatOption(
+            parser=parser,
+            name='crawl_interval',
+            default_value=60.0,
+            env_var_name='ME_CRAWL_INTERVAL_IN_SECONDS',
+            help_text=f"Seconds between two crawl steps, each step resumes from the page the previous one stopped at "
+                      f"(default: 60)",
+            name_and_flags=['--crawl.interval']
+        )
+        crawl_pages_option = IntegerOption(
+            parser=parser,
+            name='crawl_pages',
+            default_value=1,
+            env_var_name='ME_CRAWL_PAGES',
+            help_text=f"Pages read per aggregate and crawl step (default: 1)",
+            name_and_flags=['--crawl.pages']
+        )
+        crawl_page_size_option = IntegerOption(
+            parser=parser,
+            name='crawl_page_size',
+            default_value=50,
+            env_var_name='ME_CRAWL_PAGE_SIZE',
+            help_text=f"Entries per crawled page, the languages aggregate sends one more request per user "
+                      f"(default: 50)",
+            name_and_flags=['--crawl.page.size']
+        )
+        crawl_requests_option = IntegerOption(
+            parser=parser,
+            name='crawl_requests',
+            default_value=100,
+            env_var_name='ME_CRAWL_REQUESTS',
+            help_text=f"Maximum number of requests per aggregate and crawl step, pages and per-user requests of the "
+                      f"languages aggregate included; a step stopping within a page resumes from the next entry "
+                      f"(default: 100)",
+            name_and_flags=['--crawl.requests']
+        )
+        shard_index_option = IntegerOption(
+            parser=parser,
+            name='shard_index',
+            default_value=0,
+            env_var_name='ME_SHARD_INDEX',
+            help_text=f"Index of this replica among --shard.count; shard 0 also exports the installation wide metrics "
+                      f"(default: 0)",
+            name_and_flags=['--shard.index']
+        )
+        shard_count_option = IntegerOption(
+            parser=parser,
+            name='shard_count',
+            default_value=1,
+            env_var_name='ME_SHARD_COUNT',
+            help_text=f"Number of replicas sharing the per-list work, each exports the lists whose fqdn_listname "
+                      f"hashes to its index (default: 1)",
+            name_and_flags=['--shard.count']
+        )
+        lists_histogram_buckets_option = StringOption(
+            parser=parser,
+            name='lists_histogram_buckets',
+            default_value='0,1,10,50,100,500,1000,5000,10000,50000',
+            env_var_name='ME_LISTS_HISTOGRAM_BUCKETS',
+            help_text=f"Comma separated upper bounds of the list member count histogram buckets "
+                      f"(default: 0,1,10,50,100,500,1000,5000,10000,50000)",
+            name_and_flags=['--lists.histogram.buckets']
+        )
+        lists_include_option = StringOption(
+            parser=parser,
+            name='lists_include',
+            default_value='',
+            env_var_name='ME_LISTS_INCLUDE',
+            help_text=f"Only export per-list metrics for lists whose fqdn_listname fully matches this regular expression "
+                      f"(default: all lists)",
+            name_and_flags=['--lists.include']
+        )
+        lists_exclude_option = StringOption(
+            parser=parser,
+            name='lists_exclude',
+            default_value='',
+            env_var_name='ME_LISTS_EXCLUDE',
+            help_text=f"Do not export per-list metrics for lists whose fqdn_listname fully matches this regular expression "
+                      f"(default: none)",
+            name_and_flags=['--lists.exclude']
+        )
+        lists_top_option = IntegerOption(
+            parser=parser,
+            name='lists_top',
+            default_value=0,
+            env_var_name='ME_LISTS_TOP',
+            help_text=f"Only export per-list metrics for the N lists with the most members; 0 exports every list. Each "
+                      f"shard exports the top N of its own lists (default: 0)",
+            name_and_flags=['--lists.top']
+        )
         enable_gc_metrics_option = BooleanOption(
             parser=parser,
             name='enable_gc_metrics',
@@ -167,6 +658,40 @@ class Config:
             help_text=f"Enable users metrics (default: true)",
             name_and_flags=['--metrics.users']
         )
+        enable_list_members_metrics_option = BooleanOption(
+            parser=parser,
+            name='enable_list_members_metrics',
+            default_value=True,
+            env_var_name='ME_ENABLE_LIST_MEMBERS_METRICS',
+            help_text=f"Enable the members count series of every list (default: true)",
+            name_and_flags=['--metrics.list.members']
+        )
+        enable_lists_histogram_metrics_option = BooleanOption(
+            parser=parser,
+            name='enable_lists_histogram_metrics',
+            default_value=False,
+            env_var_name='ME_ENABLE_LISTS_HISTOGRAM_METRICS',
+            help_text=f"Enable the histogram of the member counts of the lists selected by --lists.include, "
+                      f"--lists.exclude and --shard.index (default: false)",
+            name_and_flags=['--metrics.lists.histogram']
+        )
+        enable_domain_histogram_metrics_option = BooleanOption(
+            parser=parser,
+            name='enable_domain_histogram_metrics',
+            default_value=False,
+            env_var_name='ME_ENABLE_DOMAIN_HISTOGRAM_METRICS',
+            help_text=f"Enable the histogram of the member counts of the lists of each domain, selected like "
+                      f"--metrics.lists.histogram (default: false)",
+            name_and_flags=['--metrics.domain.histogram']
+        )
+        enable_domain_rollup_metrics_option = BooleanOption(
+            parser=parser,
+            name='enable_domain_rollup_metrics',
+            default_value=False,
+            env_var_name='ME_ENABLE_DOMAIN_ROLLUP_METRICS',
+            help_text=f"Enable per-domain member and list counts rolled up from every list (default: false)",
+            name_and_flags=['--metrics.domain.rollup']
+        )
         enable_queue_metrics_option = BooleanOption(
             parser=parser,
             name='enable_queue_metrics',
@@ -176,18 +701,74 @@ class Config:
             name_and_flags=['--metrics.queue']
         )
 
-        args = parser.parse_args()
+        args = parser.parse_args(argv, namespace=Arguments())
+        self.argv = argv
+        self.config_file = config_file_option.value(args)
+        if self.config_file:
+            # The environment variables take precedence over the file
+            args.environment = {**parse_config_file(self.config_file), **environ}
 
         self.log_level = log_level_option.value(args)
         logging.basicConfig(handlers=[log_handler], level=self.log_level.upper())
         self.mailman_api_version = DEFAULT_MAILMAN_API_VERSION
+        self.runtime = runtime_option.value(args)
         self.hostname, self.port = parse_host_port(web_listen_option.value(args))
+        self.web_prerender = web_prerender_option.value(args)
+        self.output_textfile = output_textfile_option.value(args)
         self.mailman_address = mailman_address_option.value(args).strip('/')
         self.mailman_user = mailman_user_option.value(args)
         self.mailman_password = mailman_password_option.value(args)
+        self.mailman_connect_timeout_in_seconds = mailman_connect_timeout_option.value(args)
+        self.mailman_read_timeout_in_seconds = mailman_read_timeout_option.value(args)
+        self.mailman_pool_size = max(1, mailman_pool_size_option.value(args))
+        self.mailman_retries = max(0, mailman_retries_option.value(args))
+        self.mailman_retry_backoff_in_seconds = mailman_retry_backoff_option.value(args)
+        self.mailman_circuit_threshold = mailman_circuit_threshold_option.value(args)
+        self.mailman_circuit_reset_in_seconds = mailman_circuit_reset_option.value(args)
+        self.mailman_circuit_reset_max_in_seconds = mailman_circuit_reset_max_option.value(args)
+        self.mailman_page_size = max(1, mailman_page_size_option.value(args))
+        self.probe_targets = probe_targets_option.value(args)
+        self.probe_idle_timeout_in_seconds = probe_idle_timeout_option.value(args)
         self.namespace = namespace_option.value(args).strip()
         self.cache_duration_in_seconds = cache_duration_option.value(args)
         self.enable_caching = enable_caching_option.value(args) and self.cache_duration_in_seconds >= 0
+        self.cache_durations_in_seconds = {
+            'domains': cache_duration_domains_option.value(args),
+            'lists': cache_duration_lists_option.value(args),
+            'up': cache_duration_up_option.value(args),
+            'users': cache_duration_users_option.value(args),
+            'queue': cache_duration_queue_option.value(args),
+        }
+        for endpoint, duration in self.cache_durations_in_seconds.items():
+            if duration < 0:
+                self.cache_durations_in_seconds[endpoint] = self.cache_duration_in_seconds
+        self.cache_refresh = cache_refresh_option.value(args)
+        self.collect_deadline_in_seconds = collect_deadline_option.value(args)
+        self.cache_snapshot_file = cache_snapshot_file_option.value(args)
+        self.collect_concurrency = max(1, collect_concurrency_option.value(args))
+        self.queue_backend = queue_backend_option.value(args)
+        self.queue_path = queue_path_option.value(args)
+        self.queue_trend_window_in_seconds = queue_trend_window_option.value(args)
+        self.queue_trend_samples = queue_trend_samples_option.value(args)
+        self.logs_directory = logs_directory_option.value(args)
+        self.logs_state_file = logs_state_file_option.value(args)
+        self.logs_interval_in_seconds = max(0.1, logs_interval_option.value(args))
+        self.list_probes = parse_list_probes(list_probes_option.value(args))
+        self.list_probes_budget = max(1, list_probes_budget_option.value(args))
+        self.list_probes_concurrency = max(1, list_probes_concurrency_option.value(args))
+        self.crawl_aggregates = parse_crawl_aggregates(crawl_aggregates_option.value(args))
+        self.crawl_interval_in_seconds = max(1.0, crawl_interval_option.value(args))
+        self.crawl_pages = max(1, crawl_pages_option.value(args))
+        self.crawl_page_size = max(1, crawl_page_size_option.value(args))
+        # A page and at least one of its entries, so every step makes progress
+        self.crawl_requests = max(2, crawl_requests_option.value(args))
+        self.shard_index, self.shard_count = parse_shard(shard_index_option.value(args), shard_count_option.value(args))
+        self.lists_histogram_buckets = parse_buckets(lists_histogram_buckets_option.value(args))
+        self.lists_include = lists_include_option.value(args)
+        self.lists_exclude = lists_exclude_option.value(args)
+        self.lists_include_pattern = parse_pattern(self.lists_include)
+        self.lists_exclude_pattern = parse_pattern(self.lists_exclude)
+        self.lists_top = max(0, lists_top_option.value(args))
         self.enable_gc_metrics = enable_gc_metrics_option.value(args)
         self.enable_platform_metrics = enable_platform_metrics_option.value(args)
         self.enable_process_metrics = enable_process_metrics_option.value(args)
@@ -195,25 +776,90 @@ class Config:
         self.enable_lists_metrics = enable_lists_metrics_option.value(args)
         self.enable_up_metrics = enable_up_metrics_option.value(args)
         self.enable_users_metrics = enable_users_metrics_option.value(args)
+        self.enable_list_members_metrics = enable_list_members_metrics_option.value(args)
+        self.enable_lists_histogram_metrics = enable_lists_histogram_metrics_option.value(args)
+        self.enable_domain_histogram_metrics = enable_domain_histogram_metrics_option.value(args)
+        self.enable_domain_rollup_metrics = enable_domain_rollup_metrics_option.value(args)
         self.enable_queue_metrics = enable_queue_metrics_option.value(args)
         if log_config_option.value(args):
             self.log_config()
 
+    def reload(self) -> set[str]:
+        # Every component holds this very object, applying the changes in place reconfigures them all
+        try:
+            reloaded = Config(self.argv)
+        except ValueError as e:
+            logging.error(f"Configuration reload failed, keeping the running configuration: {e}")
+            return set()
+        changed = {name for name, value in vars(reloaded).items() if getattr(self, name, None) != value}
+        for name in sorted(changed & RESTART_SETTINGS):
+            logging.warning(f"Configuration reload: {name} changed, restart the exporter to apply it")
+        changed -= RESTART_SETTINGS
+        # Callers hold off the readers of the config, the changes still land in a single update
+        vars(self).update({name: getattr(reloaded, name) for name in changed})
+        logging.getLogger().setLevel(self.log_level.upper())
+        logging.info(f"Configuration reloaded: {', '.join(sorted(changed)) if changed else 'no change'}")
+        return changed
+
     def log_config(self, prefix: str = 'config') -> None:
         no_format = lambda value: value
         obfusacte = lambda value: '*****'
         bool_to_string = lambda value: str(value).lower()
         entries = {
             'log_level': (self.log_level, no_format),
+            'config_file': (self.config_file, no_format),
             'mailman_api_version': (self.mailman_api_version, no_format),
+            'runtime': (self.runtime, no_format),
             'hostname': (self.hostname, no_format),
             'port': (self.port, no_format),
+            'web_prerender': (self.web_prerender, bool_to_string),
+            'output_textfile': (self.output_textfile, no_format),
             'mailman_address': (self.mailman_address, no_format),
             'mailman_user': (self.mailman_user, obfusacte),
             'mailman_password': (self.mailman_password, obfusacte),
+            'mailman_connect_timeout_in_seconds': (self.mailman_connect_timeout_in_seconds, no_format),
+            'mailman_read_timeout_in_seconds': (self.mailman_read_timeout_in_seconds, no_format),
+            'mailman_pool_size': (self.mailman_pool_size, no_format),
+            'mailman_retries': (self.mailman_retries, no_format),
+            'mailman_retry_backoff_in_seconds': (self.mailman_retry_backoff_in_seconds, no_format),
+            'mailman_circuit_threshold': (self.mailman_circuit_threshold, no_format),
+            'mailman_circuit_reset_in_seconds': (self.mailman_circuit_reset_in_seconds, no_format),
+            'mailman_circuit_reset_max_in_seconds': (self.mailman_circuit_reset_max_in_seconds, no_format),
+            'mailman_page_size': (self.mailman_page_size, no_format),
+            'probe_targets': (self.probe_targets, no_format),
+            'probe_idle_timeout_in_seconds': (self.probe_idle_timeout_in_seconds, no_format),
             'namespace': (self.namespace, no_format),
             'enable_caching': (self.enable_caching, bool_to_string),
             'cache_duration_in_seconds': (self.cache_duration_in_seconds, no_format),
+            **{
+                f"cache_duration_{endpoint}_in_seconds": (duration, no_format)
+                for endpoint, duration in self.cache_durations_in_seconds.items()
+            },
+            'cache_refresh': (self.cache_refresh, no_format),
+            'collect_deadline_in_seconds': (self.collect_deadline_in_seconds, no_format),
+            'cache_snapshot_file': (self.cache_snapshot_file, no_format),
+            'collect_concurrency': (self.collect_concurrency, no_format),
+            'queue_backend': (self.queue_backend, no_format),
+            'queue_path': (self.queue_path, no_format),
+            'queue_trend_window_in_seconds': (self.queue_trend_window_in_seconds, no_format),
+            'queue_trend_samples': (self.queue_trend_samples, no_format),
+            'logs_directory': (self.logs_directory, no_format),
+            'logs_state_file': (self.logs_state_file, no_format),
+            'logs_interval_in_seconds': (self.logs_interval_in_seconds, no_format),
+            'list_probes': (','.join(self.list_probes), no_format),
+            'list_probes_budget': (self.list_probes_budget, no_format),
+            'list_probes_concurrency': (self.list_probes_concurrency, no_format),
+            'crawl_aggregates': (','.join(self.crawl_aggregates), no_format),
+            'crawl_interval_in_seconds': (self.crawl_interval_in_seconds, no_format),
+            'crawl_pages': (self.crawl_pages, no_format),
+            'crawl_page_size': (self.crawl_page_size, no_format),
+            'crawl_requests': (self.crawl_requests, no_format),
+            'shard_index': (self.shard_index, no_format),
+            'shard_count': (self.shard_count, no_format),
+            'lists_histogram_buckets': (self.lists_histogram_buckets, lambda value: ','.join(f"{bound:g}" for bound in value)),
+            'lists_include': (self.lists_include, no_format),
+            'lists_exclude': (self.lists_exclude, no_format),
+            'lists_top': (self.lists_top, no_format),
             'enable_gc_metrics': (self.enable_gc_metrics, bool_to_string),
             'enable_platform_metrics': (self.enable_platform_metrics, bool_to_string),
             'enable_process_metrics': (self.enable_process_metrics, bool_to_string),
@@ -221,11 +867,77 @@ class Config:
             'enable_lists_metrics': (self.enable_lists_metrics, bool_to_string),
             'enable_up_metrics': (self.enable_up_metrics, bool_to_string),
             'enable_users_metrics': (self.enable_users_metrics, bool_to_string),
+            'enable_list_members_metrics': (self.enable_list_members_metrics, bool_to_string),
+            'enable_lists_histogram_metrics': (self.enable_lists_histogram_metrics, bool_to_string),
+            'enable_domain_histogram_metrics': (self.enable_domain_histogram_metrics, bool_to_string),
+            'enable_domain_rollup_metrics': (self.enable_domain_rollup_metrics, bool_to_string),
             'enable_queue_metrics': (self.enable_queue_metrics, bool_to_string),
         }
         for key in entries.keys():
             logging.info(f"{prefix}({key}): {entries[key][1](entries[key][0])}")
 
+    def for_target(self, target_name: str, mailman_address: str, mailman_user: str, mailman_password: str) -> 'Config':
+        config = copy.copy(self)
+        config.mailman_address = mailman_address.strip('/')
+        config.mailman_user = mailman_user
+        config.mailman_password = mailman_password
+        # Probe targets are always collected by the threaded runtime
+        config.runtime = RUNTIME_THREADED
+        # Each target is a whole installation of its own, reached over REST: the local queue directories and the
+        # shards of this exporter describe none of them
+        config.queue_backend = QUEUE_BACKEND_REST
+        config.shard_index, config.shard_count = 0, 1
+        if config.cache_snapshot_file:
+            root, extension = os.path.splitext(config.cache_snapshot_file)
+            config.cache_snapshot_file = f"{root}.{re.sub(r'[^A-Za-z0-9_.-]', '_', target_name)}{extension}"
+        return config
+
+    @property
+    def enable_probes(self) -> bool:
+        return self.probe_targets != ''
+
+    @property
+    def enable_asyncio_runtime(self) -> bool:
+        return self.runtime == RUNTIME_ASYNCIO
+
+    @property
+    def enable_installation_metrics(self) -> bool:
+        # Metrics describing the whole installation are exported once, by the first shard
+        return self.shard_index == 0
+
+    @property
+    def enable_list_probes(self) -> bool:
+        return len(self.list_probes) > 0
+
+    @property
+    def enable_users_crawler(self) -> bool:
+        # The users and addresses are the same for every shard, the first one crawls them
+        return len(self.crawl_aggregates) > 0 and self.enable_installation_metrics
+
+    @property
+    def enable_textfile_output(self) -> bool:
+        return self.output_textfile != ''
+
+    @property
+    def enable_log_metrics(self) -> bool:
+        return self.logs_directory != ''
+
+    @property
+    def enable_queue_scanner(self) -> bool:
+        return self.queue_backend == QUEUE_BACKEND_FILESYSTEM
+
+    @property
+    def enable_queue_trends(self) -> bool:
+        return self.queue_trend_window_in_seconds > 0
+
+    @property
+    def enable_snapshot_file(self) -> bool:
+        return self.cache_snapshot_file != ''
+
+    @property
+    def enable_background_refresh(self) -> bool:
+        return self.enable_caching and self.cache_refresh == CACHE_REFRESH_IN_BACKGROUND
+
     @property
     def prefix(self) -> str:
         return f"{self.namespace}_" if self.namespace else ""
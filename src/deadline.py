@@ -0,0 +1,29 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+SCRAPE_TIMEOUT_HEADER = 'X-Prometheus-Scrape-Timeout-Seconds'
+
+# Left to render and send the response once the collection gave up on slow endpoints
+DEADLINE_MARGIN_IN_SECONDS = 0.25
+
+# Set by the HTTP server around the rendering of a scrape, read by the collector running in the same context
+scrape_deadline: ContextVar[Optional[float]] = ContextVar('scrape_deadline', default=None)
+
+
+def scrape_deadline_from(timeout_header: Optional[str], default_timeout_in_seconds: float) -> Optional[float]:
+    timeout = default_timeout_in_seconds
+    if timeout_header:
+        try:
+            timeout = float(timeout_header)
+        except ValueError:
+            pass
+    if timeout <= 0:
+        return None
+    return time.monotonic() + max(0.0, timeout - DEADLINE_MARGIN_IN_SECONDS)
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
@@ -0,0 +1,45 @@
+import gzip
+import hashlib
+import logging
+import threading
+from typing import Callable, Optional
+from prometheus_client.exposition import choose_encoder
+from prometheus_client.registry import CollectorRegistry
+
+
+class Exposition:
+    """Rendered scrape payload kept together with its gzip compressed copy and ETag."""
+
+    def __init__(self, content_type: str, body: bytes):
+        self.content_type = content_type
+        self.body = body
+        self.gzipped_body = gzip.compress(body)
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+class ExpositionCache:
+    """Renders the registry once per data refresh and serves the same bytes until the data changes."""
+
+    def __init__(self, registry: CollectorRegistry, expired: Callable[[], bool], generation: Callable[[], int]):
+        self.registry = registry
+        self.expired = expired
+        self.generation = generation
+        self._lock = threading.Lock()
+        self._rendered_generation: Optional[int] = None
+        self._expositions: dict[str, Exposition] = {}
+
+    def get(self, accept_header: str) -> Exposition:
+        encoder, content_type = choose_encoder(accept_header)
+        with self._lock:
+            if self.expired() or self.generation() != self._rendered_generation:
+                # Rendering runs the collectors, which refresh the cache and move the generation forward
+                self._expositions = {}
+                self._render(encoder, content_type)
+                self._rendered_generation = self.generation()
+            elif content_type not in self._expositions:
+                self._render(encoder, content_type)
+            return self._expositions[content_type]
+
+    def _render(self, encoder: Callable[[CollectorRegistry], bytes], content_type: str) -> None:
+        logging.debug(f"render exposition ({content_type})")
+        self._expositions[content_type] = Exposition(content_type, encoder(self.registry))
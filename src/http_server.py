@@ -0,0 +1,116 @@
+import gzip
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlparse
+from prometheus_client.exposition import choose_encoder, gzip_accepted
+from prometheus_client.registry import CollectorRegistry
+from src.config import Config
+from src.deadline import SCRAPE_TIMEOUT_HEADER, scrape_deadline, scrape_deadline_from
+from src.exposition import Exposition, ExpositionCache
+from src.probes import ProbePool
+
+METRICS_PATHS = ['/', '/metrics']
+PROBE_PATH = '/probe'
+READY_PATH = '/ready'
+
+
+class ExporterHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], registry: CollectorRegistry,
+                 exposition_cache: Optional[ExpositionCache] = None, probe_pool: Optional[ProbePool] = None,
+                 ready: Optional[Callable[[], bool]] = None, config: Optional[Config] = None):
+        self.registry = registry
+        self.exposition_cache = exposition_cache
+        self.probe_pool = probe_pool
+        self.ready = ready
+        self.config = config
+        super().__init__(address, ExporterRequestHandler)
+
+
+class ExporterRequestHandler(BaseHTTPRequestHandler):
+    server: ExporterHTTPServer
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path in METRICS_PATHS or url.path == PROBE_PATH:
+            # Collectors running in this thread give up on Mailman requests that would outlast the scrape;
+            # the configured deadline is read on every scrape so a reload applies it
+            collect_deadline_in_seconds = self.server.config.collect_deadline_in_seconds if self.server.config is not None else 0.0
+            scrape_deadline.set(scrape_deadline_from(self.headers.get(SCRAPE_TIMEOUT_HEADER), collect_deadline_in_seconds))
+        if url.path in METRICS_PATHS:
+            names = parse_qs(url.query).get('name[]')
+            if self.server.exposition_cache is not None and not names:
+                self.send_exposition(self.server.exposition_cache.get(self.headers.get('Accept', '')))
+            elif names:
+                self.send_registry(self.server.registry.restricted_registry(names))
+            else:
+                self.send_registry(self.server.registry)
+        elif url.path == READY_PATH:
+            if self.server.ready is None or self.server.ready():
+                self.send_text(200, b'ready\n')
+            else:
+                self.send_text(503, b'waiting for mailman\n')
+        elif url.path == PROBE_PATH and self.server.probe_pool is not None:
+            target = parse_qs(url.query).get('target', [''])[0]
+            if not target:
+                self.send_error(400, 'Missing target parameter')
+                return
+            registry = self.server.probe_pool.registry(target)
+            if registry is None:
+                self.send_error(404, f"Unknown target {target}")
+                return
+            self.send_registry(registry)
+        else:
+            self.send_error(404)
+
+    def send_text(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_registry(self, registry: CollectorRegistry) -> None:
+        encoder, content_type = choose_encoder(self.headers.get('Accept', ''))
+        body = encoder(registry)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        if gzip_accepted(self.headers.get('Accept-Encoding', '')):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_exposition(self, exposition: Exposition) -> None:
+        if self.headers.get('If-None-Match') == exposition.etag:
+            self.send_response(304)
+            self.send_header('ETag', exposition.etag)
+            self.end_headers()
+            return
+        body = exposition.body
+        self.send_response(200)
+        self.send_header('Content-Type', exposition.content_type)
+        self.send_header('ETag', exposition.etag)
+        self.send_header('Vary', 'Accept, Accept-Encoding')
+        if gzip_accepted(self.headers.get('Accept-Encoding', '')):
+            body = exposition.gzipped_body
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def start_server(hostname: str, port: int, registry: CollectorRegistry,
+                 exposition_cache: Optional[ExpositionCache] = None, probe_pool: Optional[ProbePool] = None,
+                 ready: Optional[Callable[[], bool]] = None, config: Optional[Config] = None) -> ExporterHTTPServer:
+    server = ExporterHTTPServer((hostname, port), registry, exposition_cache, probe_pool, ready, config)
+    thread = threading.Thread(target=server.serve_forever, name='http-server', daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,32 @@
+import math
+from hashlib import blake2b
+
+HYPERLOGLOG_PRECISION = 14
+
+
+class HyperLogLog:
+    """Estimates the number of distinct values added in a fixed 2^precision bytes, within about 1.04/sqrt(2^precision)."""
+
+    __slots__ = ('precision', 'registers')
+
+    def __init__(self, precision: int = HYPERLOGLOG_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: str) -> None:
+        # A 64-bit hash stable across processes, unlike hash() for strings
+        hashed = int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), 'big')
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            return m * math.log(m / zeros)
+        return estimate
@@ -0,0 +1,74 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from src.api import Api
+from src.config import Config
+
+# Per-list collections counted by the probes, by probe name
+LIST_PROBES = {
+    'owners': '/roster/owner',
+    'moderators': '/roster/moderator',
+    'nonmembers': '/roster/nonmember',
+    'held': '/held',
+    'requests': '/requests',
+}
+
+
+class ListProbes:
+    """Counts per-list collections from their total_size, a bounded slice of the lists on every refresh."""
+
+    def __init__(self, api: Api, config: Config):
+        self.api = api
+        self.config = config
+        self.probes = {name: LIST_PROBES[name] for name in config.list_probes}
+        self.counts: dict[str, dict[str, int]] = {name: {} for name in self.probes.keys()}
+        self.requests = 0
+        self._cursor = 0
+        # Probes of the last refresh with the cursor position of their list
+        self._pending: list[tuple[int, Future]] = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=config.list_probes_concurrency, thread_name_prefix='mailman3-list-probe')
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def refresh(self, fqdn_listnames: list[str]) -> None:
+        # Never waits for the probes: scrapes serve the counts recorded so far and each probe records its count
+        # whenever it completes
+        if not self.probes or not fqdn_listnames:
+            return
+        self._forget(fqdn_listnames)
+        # Probes queued by the previous refresh are dropped and their lists probed again next, while any is still
+        # running no new slice is queued so a slow Mailman never grows the executor queue past one slice
+        for position, future in self._pending:
+            if future.cancel():
+                self._cursor = min(self._cursor, position)
+        self._pending = [(position, future) for position, future in self._pending if not future.done()]
+        if self._pending:
+            logging.debug(f"skipped probing, {len(self._pending)} probes of the previous refresh still running")
+            return
+        # Round-robin through the lists, the budget bounds the requests of each refresh
+        slice_size = min(len(fqdn_listnames), max(1, self.config.list_probes_budget // len(self.probes)))
+        start = self._cursor % len(fqdn_listnames)
+        self._cursor = start + slice_size
+        selected = [fqdn_listnames[(start + offset) % len(fqdn_listnames)] for offset in range(slice_size)]
+        self._pending = [
+            (start + offset, self._executor.submit(self._probe, probe, endpoint, fqdn_listname))
+            for offset, fqdn_listname in enumerate(selected) for probe, endpoint in self.probes.items()
+        ]
+        logging.debug(f"queued probes of {slice_size} lists from position {start}")
+
+    def _probe(self, probe: str, endpoint: str, fqdn_listname: str) -> None:
+        status, resp = self.api.count(f"list_{probe}", f"/lists/{fqdn_listname}{endpoint}")
+        with self._lock:
+            self.requests += 1
+            if 200 <= status < 220:
+                self.counts[probe][fqdn_listname] = resp['total_size']
+
+    def _forget(self, fqdn_listnames: list[str]) -> None:
+        # Deleted lists, or lists no longer selected by the filters, stop being exported
+        current = set(fqdn_listnames)
+        with self._lock:
+            for counts in self.counts.values():
+                for fqdn_listname in [name for name in counts.keys() if name not in current]:
+                    del counts[fqdn_listname]
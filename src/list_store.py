@@ -0,0 +1,118 @@
+import heapq
+from bisect import bisect_right
+import re
+import sys
+import zlib
+from array import array
+from typing import Any, Iterable, Iterator, Optional
+
+
+class ListStore:
+    """Columnar copy of the /lists collection keeping only what the per-list metrics need."""
+
+    __slots__ = ('total_size', 'names', 'member_counts', 'domain_members', 'domain_lists', 'include', 'exclude',
+                 'shard_index', 'shard_count', '_top', '_histograms', '_seen')
+
+    def __init__(self, total_size: int = 0, include: Optional[re.Pattern] = None, exclude: Optional[re.Pattern] = None,
+                 shard_index: int = 0, shard_count: int = 1):
+        self.total_size = total_size
+        self.names: list[str] = []
+        self.member_counts = array('q')
+        self.domain_members: dict[str, int] = {}
+        self.domain_lists: dict[str, int] = {}
+        self.include = include
+        self.exclude = exclude
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self._top: Optional[tuple[int, list[tuple[str, int]]]] = None
+        # Histograms only depend on the store and the buckets, they are computed once per refresh
+        self._histograms: dict[tuple[str, tuple[float, ...]], Any] = {}
+        # Names read so far, a list seen twice because the pages shifted is only counted once
+        self._seen: Optional[set[str]] = set()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[tuple[str, int]]:
+        return zip(self.names, self.member_counts)
+
+    def extend(self, entries: Iterable[dict[str, Any]]) -> None:
+        for entry in entries:
+            fqdn_listname, member_count = entry['fqdn_listname'], entry['member_count']
+            if self._seen is not None:
+                if fqdn_listname in self._seen:
+                    continue
+                self._seen.add(fqdn_listname)
+            # Domain rollups account for every list, filters only bound the per-list series
+            domain = sys.intern(fqdn_listname.partition('@')[2])
+            self.domain_members[domain] = self.domain_members.get(domain, 0) + member_count
+            self.domain_lists[domain] = self.domain_lists.get(domain, 0) + 1
+            if self.selects(fqdn_listname):
+                # Interning shares the name strings with the label values of every rendered sample
+                self.names.append(sys.intern(fqdn_listname))
+                self.member_counts.append(member_count)
+
+    def selects(self, fqdn_listname: str) -> bool:
+        if self.include is not None and not self.include.fullmatch(fqdn_listname):
+            return False
+        if self.exclude is not None and self.exclude.fullmatch(fqdn_listname):
+            return False
+        # crc32 is stable across processes and Python versions, unlike hash()
+        return self.shard_count <= 1 or zlib.crc32(fqdn_listname.encode()) % self.shard_count == self.shard_index
+
+    def to_snapshot(self) -> dict[str, Any]:
+        return {
+            'total_size': self.total_size,
+            'names': self.names,
+            'member_counts': self.member_counts.tolist(),
+            'domain_members': self.domain_members,
+            'domain_lists': self.domain_lists,
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict[str, Any], include: Optional[re.Pattern] = None, exclude: Optional[re.Pattern] = None,
+                      shard_index: int = 0, shard_count: int = 1) -> 'ListStore':
+        # The saved lists were selected by the filters of the exporter that saved them, the current filters can only
+        # narrow them down; the domain rollups cover every list either way
+        lists = cls(snapshot['total_size'], include, exclude, shard_index, shard_count)
+        lists.domain_members = {sys.intern(domain): count for domain, count in snapshot['domain_members'].items()}
+        lists.domain_lists = {sys.intern(domain): count for domain, count in snapshot['domain_lists'].items()}
+        for fqdn_listname, member_count in zip(snapshot['names'], snapshot['member_counts']):
+            if lists.selects(fqdn_listname):
+                lists.names.append(sys.intern(fqdn_listname))
+                lists.member_counts.append(member_count)
+        lists.seal()
+        return lists
+
+    def seal(self) -> None:
+        # Called once the last page is read, the duplicate check is only needed while paging
+        self._seen = None
+
+    def top(self, n: int) -> list[tuple[str, int]]:
+        # The store does not change once built, the selection is computed once per refresh
+        if self._top is None or self._top[0] != n:
+            self._top = n, heapq.nlargest(n, self, key=lambda entry: entry[1])
+        return self._top[1]
+
+    def histogram(self, buckets: tuple[float, ...]) -> tuple[list[int], int]:
+        key = ('lists', buckets)
+        if key not in self._histograms:
+            self._histograms[key] = cumulative_buckets(sorted(self.member_counts), buckets), sum(self.member_counts)
+        return self._histograms[key]
+
+    def domain_histograms(self, buckets: tuple[float, ...]) -> dict[str, tuple[list[int], int]]:
+        key = ('domains', buckets)
+        if key not in self._histograms:
+            counts_per_domain: dict[str, list[int]] = {}
+            for fqdn_listname, member_count in self:
+                counts_per_domain.setdefault(fqdn_listname.partition('@')[2], []).append(member_count)
+            self._histograms[key] = {
+                domain: (cumulative_buckets(sorted(counts), buckets), sum(counts))
+                for domain, counts in counts_per_domain.items()
+            }
+        return self._histograms[key]
+
+
+def cumulative_buckets(sorted_counts: list[int], buckets: tuple[float, ...]) -> list[int]:
+    # One binary search per bucket bound over the sorted counts, the last bucket is +Inf
+    return [bisect_right(sorted_counts, bound) for bound in buckets] + [len(sorted_counts)]
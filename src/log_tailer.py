@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+from typing import IO, Iterator, Optional
+
+READ_CHUNK_SIZE = 1 << 20
+
+
+class TailedFile:
+    """Follows a log file across rotations and truncations, reading every byte once."""
+
+    def __init__(self, path: str, inode: int = 0, offset: int = -1):
+        self.path = path
+        # Position of the end of the last complete line read, -1 starts at the end of the file
+        self.inode = inode
+        self.offset = offset
+        self.rotations = 0
+        self.truncations = 0
+        self._file: Optional[IO[bytes]] = None
+        self._partial = b''
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def poll(self) -> Iterator[list[str]]:
+        if self._file is None:
+            try:
+                self._open(resume=True)
+            except FileNotFoundError:
+                # Whatever gets logged once the file is created is new
+                self.offset = 0
+                return
+        # Drain the open file first, after a rotation it still is the old one
+        yield from self._read()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self.inode:
+            self.rotations += 1
+            self.close()
+            self._open(resume=False)
+            yield from self._read()
+        elif stat.st_size < self.offset:
+            self.truncations += 1
+            self._file.seek(0)
+            self.offset = 0
+            self._partial = b''
+            yield from self._read()
+
+    def _open(self, resume: bool) -> None:
+        file = open(self.path, 'rb')
+        stat = os.fstat(file.fileno())
+        if resume and self.offset < 0:
+            # No saved offset, only lines written from now on are counted
+            self.offset = stat.st_size
+        elif not resume or stat.st_ino != self.inode or self.offset > stat.st_size:
+            self.offset = 0
+        file.seek(self.offset)
+        self.inode = stat.st_ino
+        self._file = file
+        self._partial = b''
+
+    def _read(self) -> Iterator[list[str]]:
+        while True:
+            chunk = self._file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            data = self._partial + chunk
+            end = data.rfind(b'\n')
+            if end < 0:
+                self._partial = data
+                continue
+            self._partial = data[end + 1:]
+            self.offset += end + 1
+            # One decode and one split per chunk, lines are parsed as a batch
+            yield data[:end].decode('utf-8', 'replace').split('\n')
+
+
+def load_offsets(path: str) -> dict[str, tuple[int, int]]:
+    try:
+        with open(path) as file:
+            return {name: (inode, offset) for name, (inode, offset) in json.load(file).items()}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, TypeError) as e:
+        logging.warning(f"Ignoring unreadable log offsets file {path}: {e!r}")
+        return {}
+
+
+def save_offsets(path: str, files: dict[str, TailedFile]) -> None:
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'w') as file:
+        json.dump({name: (tailed.inode, tailed.offset) for name, tailed in files.items()}, file)
+    os.replace(temporary_path, path)
@@ -1,4 +1,4 @@
-from typing import TypeVar, Generic, Self
+from typing import TypeVar, Generic, Mapping, Self
 from argparse import ArgumentParser, Namespace
 from os import environ
 from abc import ABC, abstractmethod
@@ -7,6 +7,14 @@ import logging
 T = TypeVar('T')
 
 
+class Arguments(Namespace):
+    """Parsed command line, along with the environment variables the options fall back to."""
+
+    def __init__(self, environment: Mapping[str, str] = environ):
+        super().__init__()
+        self.environment = environment
+
+
 class Option(Generic[T], ABC):
     def __init__(self, parser: ArgumentParser, name: str, default_value: T, env_var_name: str, help_text: str, name_and_flags: list[str]):
         self.parser = parser
@@ -18,7 +26,7 @@ class Option(Generic[T], ABC):
         self._add_argument()
 
     def value(self, args: Namespace) -> T:
-        env_var_value = self._retrieve_env_var_value()
+        env_var_value = self._retrieve_env_var_value(args)
         option_value = self._retrieve_option_value(args)
         if option_value is not None:
             return option_value
@@ -42,14 +50,15 @@ class Option(Generic[T], ABC):
     def _env_var_name_validation_error_message(self, env_var_name: str, value: str) -> str:
         raise NotImplementedError()
 
-    def _retrieve_env_var_value(self) -> T | None:
+    def _retrieve_env_var_value(self, args: Namespace) -> T | None:
+        environment = args.environment if isinstance(args, Arguments) else environ
         # Check env var name is set
         if self.env_var_name is None:
             return None
         # Check env var exists
-        if self.env_var_name not in environ:
+        if self.env_var_name not in environment:
             return None
-        value = environ[self.env_var_name]
+        value = environment[self.env_var_name]
         # Check value is valid
         if not self._validator(value):
             logging.error(self._env_var_name_validation_error_message(self.env_var_name, value))
@@ -0,0 +1,64 @@
+import logging
+from itertools import count
+from typing import Any, Awaitable, Callable, Generator
+from src.config import Config
+from src.list_store import ListStore
+
+# A walk yields the (name, endpoint) of each request it needs and receives its response, the threaded and the
+# asyncio clients only differ in how they send the requests
+Walk = Generator[tuple[str, str], tuple[int, Any], tuple[int, Any]]
+
+LISTS_WALK_ATTEMPTS = 3
+
+
+def page_endpoint(endpoint: str, page_size: int, page: int) -> str:
+    separator = '&' if '?' in endpoint else '?'
+    return f"{endpoint}{separator}count={page_size}&page={page}"
+
+
+def count_endpoint(endpoint: str) -> str:
+    # A one entry page still carries the total_size of the whole collection
+    return page_endpoint(endpoint, 1, 1)
+
+
+def last_page(resp: dict[str, Any], page: int, page_size: int) -> bool:
+    return not resp.get('entries') or page * page_size >= resp.get('total_size', 0)
+
+
+def lists_walk(config: Config) -> Walk:
+    # Offsets shift when a list is created or deleted between two pages, a changed total_size restarts the walk;
+    # the last attempt keeps going and relies on the store dropping duplicates
+    for attempt in range(1, LISTS_WALK_ATTEMPTS + 1):
+        # Only keep what the per-list metrics need, each page is released before the next one is requested
+        lists = ListStore(include=config.lists_include_pattern, exclude=config.lists_exclude_pattern,
+                          shard_index=config.shard_index, shard_count=config.shard_count)
+        for page in count(1):
+            status, resp = yield 'lists', page_endpoint('/lists', config.mailman_page_size, page)
+            if not 200 <= status < 220:
+                return status, {}
+            if page > 1 and resp['total_size'] != lists.total_size and attempt < LISTS_WALK_ATTEMPTS:
+                logging.debug(f"lists: collection changed while paging ({lists.total_size} -> {resp['total_size']}), restarting")
+                break
+            lists.total_size = resp['total_size']
+            lists.extend(resp.get('entries', []))
+            if last_page(resp, page, config.mailman_page_size):
+                lists.seal()
+                return status, lists
+
+
+def run_walk(walk: Walk, request: Callable[[str, str], tuple[int, Any]]) -> tuple[int, Any]:
+    try:
+        name, endpoint = next(walk)
+        while True:
+            name, endpoint = walk.send(request(name, endpoint))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def run_walk_async(walk: Walk, request: Callable[[str, str], Awaitable[tuple[int, Any]]]) -> tuple[int, Any]:
+    try:
+        name, endpoint = next(walk)
+        while True:
+            name, endpoint = walk.send(await request(name, endpoint))
+    except StopIteration as stop:
+        return stop.value
@@ -0,0 +1,112 @@
+import configparser
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector, CollectorRegistry, REGISTRY
+from src.api import Api
+from src.collectors.mailman3_collector import Mailman3Collector
+from src.config import Config
+from src.single_flight import SingleFlight
+
+
+class Target:
+    def __init__(self, name: str, mailman_address: str, mailman_user: str, mailman_password: str):
+        self.name = name
+        self.mailman_address = mailman_address
+        self.mailman_user = mailman_user
+        self.mailman_password = mailman_password
+
+
+def load_targets(path: str, config: Config) -> dict[str, Target]:
+    parser = configparser.ConfigParser(interpolation=None)
+    with open(path) as targets_file:
+        parser.read_file(targets_file)
+    targets = {}
+    for name in parser.sections():
+        section = parser[name]
+        if 'address' not in section:
+            raise ValueError(f"probe target '{name}' has no address")
+        targets[name] = Target(
+            name,
+            section['address'],
+            section.get('user', config.mailman_user),
+            section.get('password', config.mailman_password),
+        )
+    logging.info(f"Loaded {len(targets)} probe targets from {path}")
+    return targets
+
+
+class Probe:
+    """Connection pool, cache and collector of one target, each target scraped into its own registry."""
+
+    def __init__(self, target: Target, config: Config):
+        self.config = config.for_target(target.name, target.mailman_address, target.mailman_user, target.mailman_password)
+        self.api = Api(self.config)
+        self.registry = CollectorRegistry()
+        self.collector = Mailman3Collector(api=self.api, config=self.config, registry=self.registry)
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        self.collector.close()
+        self.api.close()
+
+
+class ProbePool(Collector):
+    """Creates probes the first time their target is scraped and evicts them once idle."""
+
+    def __init__(self, targets: dict[str, Target], config: Config, registry: Optional[CollectorRegistry] = REGISTRY):
+        self.targets = targets
+        self.config = config
+        self._lock = threading.Lock()
+        self._probes: dict[str, Probe] = {}
+        self._single_flight = SingleFlight()
+        self.evictions = 0
+
+        if registry:
+            registry.register(self)
+
+    def registry(self, name: str) -> Optional[CollectorRegistry]:
+        target = self.targets.get(name)
+        if target is None:
+            return None
+        self.evict_idle()
+        with self._lock:
+            probe = self._probes.get(name)
+        if probe is None:
+            probe = self._single_flight.do(name, lambda: self._create(target))
+        probe.last_used = time.monotonic()
+        return probe.registry
+
+    def _create(self, target: Target) -> Probe:
+        with self._lock:
+            probe = self._probes.get(target.name)
+        if probe is None:
+            logging.info(f"Creating probe for target {target.name} <{target.mailman_address}>")
+            probe = Probe(target, self.config)
+            with self._lock:
+                self._probes[target.name] = probe
+        return probe
+
+    def evict_idle(self) -> None:
+        deadline = time.monotonic() - self.config.probe_idle_timeout_in_seconds
+        with self._lock:
+            idle = [name for name, probe in self._probes.items() if probe.last_used < deadline]
+            evicted = [self._probes.pop(name) for name in idle]
+            self.evictions += len(evicted)
+        for name, probe in zip(idle, evicted):
+            logging.info(f"Evicting idle probe for target {name}")
+            probe.close()
+
+    def collect(self) -> Iterable[Metric]:
+        self.evict_idle()
+        mailman3_probe_targets = GaugeMetricFamily(f"{self.config.prefix}mailman3_probe_targets", 'Number of configured probe targets')
+        mailman3_probe_targets.add_metric([], len(self.targets))
+        mailman3_probe_targets_active = GaugeMetricFamily(f"{self.config.prefix}mailman3_probe_targets_active",
+                                                          'Number of probe targets holding connections and cached data')
+        mailman3_probe_targets_active.add_metric([], len(self._probes))
+        mailman3_probe_evictions = CounterMetricFamily(f"{self.config.prefix}mailman3_probe_evictions",
+                                                       'Probe targets released after being idle')
+        mailman3_probe_evictions.add_metric([], self.evictions)
+        return [mailman3_probe_targets, mailman3_probe_targets_active, mailman3_probe_evictions]
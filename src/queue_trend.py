@@ -0,0 +1,85 @@
+import math
+import threading
+from collections import deque
+from typing import Any, Optional
+
+REBASE_AFTER_WINDOWS = 10
+
+
+class QueueTrend:
+    """Least squares fit of one queue's length over a sliding window, updated in O(1) per sample."""
+
+    def __init__(self, window: float, capacity: int):
+        self.window = window
+        self.samples: deque[tuple[float, int]] = deque()
+        self.capacity = capacity
+        # Running sums of the regression, times are relative to the first sample to keep them small
+        self._origin: Optional[float] = None
+        self._sx = self._sy = self._sxx = self._sxy = 0.0
+
+    def add(self, timestamp: float, count: int) -> None:
+        while self.samples and (len(self.samples) >= self.capacity or timestamp - self.samples[0][0] > self.window):
+            self._accumulate(*self.samples.popleft(), -1)
+        if self._origin is None or timestamp - self._origin > REBASE_AFTER_WINDOWS * self.window:
+            self._rebase(self.samples[0][0] if self.samples else timestamp)
+        self.samples.append((timestamp, count))
+        self._accumulate(timestamp, count, 1)
+
+    def _rebase(self, origin: float) -> None:
+        # Recomputing the sums now and then also drops the rounding errors accumulated by removals
+        self._origin = origin
+        self._sx = self._sy = self._sxx = self._sxy = 0.0
+        for timestamp, count in self.samples:
+            self._accumulate(timestamp, count, 1)
+
+    def _accumulate(self, timestamp: float, count: int, sign: int) -> None:
+        x = timestamp - self._origin
+        self._sx += sign * x
+        self._sy += sign * count
+        self._sxx += sign * x * x
+        self._sxy += sign * x * count
+
+    @property
+    def growth_rate(self) -> Optional[float]:
+        n = len(self.samples)
+        if n < 2:
+            return None
+        denominator = n * self._sxx - self._sx * self._sx
+        if denominator <= 0:
+            return None
+        return (n * self._sxy - self._sx * self._sy) / denominator
+
+    @property
+    def drain_eta(self) -> Optional[float]:
+        rate = self.growth_rate
+        if rate is None:
+            return None
+        count = self.samples[-1][1]
+        if count == 0:
+            return 0.0
+        if rate >= 0:
+            return math.inf
+        return count / -rate
+
+
+class QueueTrends:
+    """Queue trends of every Mailman queue, fed with each new /queues response and the time it was fetched at."""
+
+    def __init__(self, window: float, capacity: int):
+        self.window = window
+        self.capacity = max(2, capacity)
+        self.trends: dict[str, QueueTrend] = {}
+        self._last_response: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    def observe(self, response: Any, fetched_at: float) -> None:
+        with self._lock:
+            # Cached responses are the same object, only sample data fetched from Mailman
+            if response is self._last_response:
+                return
+            self._last_response = response
+            for entry in response.get('entries', []):
+                trend = self.trends.get(entry['name'])
+                if trend is None:
+                    trend = self.trends[entry['name']] = QueueTrend(self.window, self.capacity)
+                trend.add(fetched_at, entry['count'])
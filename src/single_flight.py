@@ -0,0 +1,55 @@
+import threading
+from typing import Any, Callable, Optional
+
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs a function once for every caller asking for the same key while a previous call is still running."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, Call] = {}
+        self.coalesced: dict[str, int] = {}
+
+    def do(self, key: str, function: Callable[[], Any], timeout: Optional[float] = None,
+           fallback: Optional[Callable[[], Any]] = None) -> Any:
+        # Callers joining a running call wait for it at most timeout seconds, then get the fallback's result instead
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Call()
+                self._calls[key] = call
+            else:
+                self._record_coalesced(key)
+        if not leader:
+            if not call.done.wait(timeout):
+                if fallback is None:
+                    raise TimeoutError(f"{key}: call still running after {timeout} seconds")
+                return fallback()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def record_coalesced(self, key: str) -> None:
+        with self._lock:
+            self._record_coalesced(key)
+
+    def _record_coalesced(self, key: str) -> None:
+        self.coalesced[key] = self.coalesced.get(key, 0) + 1
@@ -0,0 +1,58 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Optional
+from src.list_store import ListStore
+
+SNAPSHOT_FILE_VERSION = 2
+
+
+def encode_response(response: tuple[int, Any]) -> dict[str, Any]:
+    status, body = response
+    if isinstance(body, ListStore):
+        return {'status': status, 'lists': body.to_snapshot()}
+    return {'status': status, 'body': body}
+
+
+def decode_response(encoded: dict[str, Any], restore_lists: Callable[[dict[str, Any]], ListStore]) -> tuple[int, Any]:
+    if 'lists' in encoded:
+        return encoded['status'], restore_lists(encoded['lists'])
+    return encoded['status'], encoded['body']
+
+
+def save_snapshot(path: str, responses: dict[str, tuple[int, Any]]) -> None:
+    # Plain JSON data, loading the file never runs code; written next to the target and renamed over it,
+    # readers never see a partial file
+    temporary_path = f"{path}.tmp"
+    snapshot = {
+        'version': SNAPSHOT_FILE_VERSION,
+        'saved_at': time.time(),
+        'responses': {name: encode_response(response) for name, response in responses.items()},
+    }
+    with open(temporary_path, 'w') as file:
+        json.dump(snapshot, file, separators=(',', ':'))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def load_snapshot(path: str, restore_lists: Callable[[dict[str, Any]], ListStore]) -> Optional[tuple[float, dict[str, tuple[int, Any]]]]:
+    try:
+        with open(path) as file:
+            snapshot = json.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable snapshot file {path}: {e!r}")
+        return None
+    version = snapshot.get('version') if isinstance(snapshot, dict) else None
+    if version != SNAPSHOT_FILE_VERSION:
+        logging.warning(f"Ignoring snapshot file {path} of version {version} (expected {SNAPSHOT_FILE_VERSION})")
+        return None
+    try:
+        responses = {name: decode_response(encoded, restore_lists) for name, encoded in snapshot['responses'].items()}
+    except (KeyError, TypeError, ValueError) as e:
+        logging.warning(f"Ignoring malformed snapshot file {path}: {e!r}")
+        return None
+    return snapshot['saved_at'], responses
@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Iterator, Optional
+from src.api import Api
+from src.config import Config
+from src.hyperloglog import HyperLogLog
+from src.paging import count_endpoint, page_endpoint
+
+# Collection paged through by each aggregate, members are projected on their user link
+CRAWL_ENDPOINTS = {
+    'addresses': '/addresses',
+    'languages': '/users',
+    'memberships': '/members?fields=user',
+}
+
+UNSET_LANGUAGE = 'unset'
+UNKNOWN_LANGUAGE = 'unknown'
+
+
+class Crawl:
+    """Page cursor and running aggregates of one collection, the aggregates of the last full pass are the exported ones."""
+
+    def __init__(self, name: str, endpoint: str):
+        self.name = name
+        self.endpoint = endpoint
+        self.page = 1
+        # Entries of the current page already folded by a step that stopped within it
+        self.offset = 0
+        self.total_size = 0
+        self.requests_left = 0
+        self.partial: Counter = Counter()
+        self.complete: Optional[Counter] = None
+        self.users = HyperLogLog()
+        self.passes = 0
+        self.completed_at = 0.0
+
+    def restart(self) -> None:
+        self.partial = Counter()
+        self.users = HyperLogLog()
+        self.page, self.offset = 1, 0
+
+    def finish(self) -> None:
+        self.complete = self.partial
+        self.restart()
+        self.passes += 1
+        self.completed_at = time.time()
+
+
+class UsersCrawler:
+    """Pages through the users, addresses and members a few pages at a time and folds them into aggregates."""
+
+    def __init__(self, api: Api, config: Config):
+        self.api = api
+        self.config = config
+        self.crawls = {name: Crawl(name, CRAWL_ENDPOINTS[name]) for name in config.crawl_aggregates}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._crawler = threading.Thread(target=self._crawl_loop, name='mailman3-users-crawler', daemon=True)
+
+    def start(self) -> None:
+        self._crawler.start()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def _crawl_loop(self) -> None:
+        while True:
+            for crawl in self.crawls.values():
+                try:
+                    self.step(crawl)
+                except Exception as e:
+                    logging.error(f"crawl_{crawl.name}(exception): {e}")
+            if self._stop.wait(self.config.crawl_interval_in_seconds):
+                return
+
+    def step(self, crawl: Crawl) -> None:
+        fold = {'addresses': self.fold_addresses, 'languages': self.fold_languages, 'memberships': self.fold_memberships}[crawl.name]
+        crawl.requests_left = self.config.crawl_requests
+        entries = self.entries(crawl)
+        try:
+            fold(crawl, entries)
+        finally:
+            entries.close()
+
+    def request(self, crawl: Crawl, endpoint: str) -> tuple[int, Any]:
+        status, resp = self.api.make_request(f"crawl_{crawl.name}", endpoint)
+        crawl.requests_left -= 1
+        with self._lock:
+            self.requests += 1
+        return status, resp
+
+    def entries(self, crawl: Crawl) -> Iterator[dict[str, Any]]:
+        # Only the page being folded is held, the next step resumes from the page after it
+        page_size = self.config.crawl_page_size
+        for _ in range(self.config.crawl_pages):
+            if crawl.requests_left <= 0:
+                return
+            status, resp = self.request(crawl, page_endpoint(crawl.endpoint, page_size, crawl.page))
+            if not 200 <= status < 220:
+                # The same page is requested again on the next step
+                return
+            crawl.total_size = resp.get('total_size', 0)
+            # A fold stopping early closes the generator at the yield, the entry it did not fold is not counted
+            for entry in resp.get('entries', [])[crawl.offset:]:
+                yield entry
+                crawl.offset += 1
+            if crawl.page * page_size >= crawl.total_size:
+                self.finish(crawl)
+                return
+            crawl.page, crawl.offset = crawl.page + 1, 0
+
+    def finish(self, crawl: Crawl) -> None:
+        if crawl.name == 'memberships':
+            status, resp = self.request(crawl, count_endpoint('/users'))
+            if not 200 <= status < 220:
+                # Start over rather than publish an aggregate missing its user count
+                crawl.restart()
+                return
+            crawl.partial['users_without_memberships'] = max(0, resp['total_size'] - round(crawl.users.estimate()))
+            crawl.partial['memberships'] = crawl.total_size
+        with self._lock:
+            crawl.finish()
+        logging.debug(f"crawl_{crawl.name}: pass {crawl.passes} completed over {crawl.total_size} entries")
+
+    @staticmethod
+    def fold_addresses(crawl: Crawl, entries: Iterator[dict[str, Any]]) -> None:
+        for entry in entries:
+            crawl.partial['verified' if entry.get('verified_on') else 'unverified'] += 1
+            if 'user' not in entry:
+                crawl.partial['without_user'] += 1
+
+    def fold_languages(self, crawl: Crawl, entries: Iterator[dict[str, Any]]) -> None:
+        # The preferred language is only exposed by each user's preferences, one request per user within the step budget
+        for entry in entries:
+            if crawl.requests_left <= 0:
+                return
+            status, resp = self.request(crawl, f"/users/{entry['user_id']}/preferences")
+            # Users whose preferences could not be read are still counted, the pass adds up to every user
+            crawl.partial[resp.get('preferred_language', UNSET_LANGUAGE) if 200 <= status < 220 else UNKNOWN_LANGUAGE] += 1
+
+    @staticmethod
+    def fold_memberships(crawl: Crawl, entries: Iterator[dict[str, Any]]) -> None:
+        # A user is subscribed once per list and role, distinct users are counted by a fixed-size HyperLogLog
+        for entry in entries:
+            if 'user' in entry:
+                crawl.users.add(entry['user'])
+
+    def aggregates(self, name: str) -> Optional[Counter]:
+        crawl = self.crawls.get(name)
+        return None if crawl is None else crawl.complete
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+from src.api import Api
+from src.async_runtime import AsyncCollectorEngine
+from src.collectors.mailman3_collector import Mailman3Collector
+from src.config import Config
+
+
+def test_fetch_waits_for_a_reload_without_blocking_the_loop():
+    config = Config(['--log-level', 'critical', '--runtime', 'asyncio'])
+    collector = Mailman3Collector(Api(config), config, registry=None)
+    engine = AsyncCollectorEngine(None, collector, config)
+    fetched = []
+
+    async def fetch(deadline=None):
+        fetched.append(config.namespace)
+        return {}
+
+    engine._fetch = fetch
+    writing, release = threading.Event(), threading.Event()
+
+    def reload() -> None:
+        with collector.config_lock.writing():
+            writing.set()
+            release.wait()
+            config.namespace = 'reloaded'
+
+    async def scenario() -> int:
+        loop = asyncio.get_running_loop()
+        reloading = loop.run_in_executor(None, reload)
+        await loop.run_in_executor(None, writing.wait)
+        fetch_task = asyncio.create_task(engine.fetch())
+        ticks = 0
+        # The loop keeps running other callbacks while the fetch waits for the reload
+        while ticks < 5:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not fetch_task.done() and fetched == []
+        release.set()
+        await reloading
+        await fetch_task
+        return ticks
+
+    # Lets a fetch blocking the loop through, the scenario then fails instead of hanging
+    safety = threading.Timer(2, release.set)
+    safety.start()
+    try:
+        assert asyncio.run(asyncio.wait_for(scenario(), 5)) == 5
+    finally:
+        safety.cancel()
+        release.set()
+        collector.close()
+    assert fetched == ['reloaded']
+    # The read lock was released, a reload is possible again
+    with collector.config_lock.writing():
+        pass
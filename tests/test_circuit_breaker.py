@@ -0,0 +1,119 @@
+from src.api import Api, CIRCUIT_OPEN_STATUS
+from src.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers
+from src.config import Config
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def open_breaker(clock: FakeClock, threshold: int = 3) -> CircuitBreaker:
+    breaker = CircuitBreaker(threshold, 10, 40, clock)
+    for _ in range(threshold):
+        assert breaker.allow()
+        breaker.record(False)
+    return breaker
+
+
+def test_opens_after_threshold_consecutive_failures():
+    breaker = CircuitBreaker(3, 10, 40, FakeClock())
+    for _ in range(2):
+        breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+
+def test_open_breaker_rejects_until_the_reset_timeout():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now += 9.9
+    assert not breaker.allow()
+    assert breaker.rejections == 1
+    clock.now += 0.1
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only the probe goes through while half-open
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes_the_breaker():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probes_double_the_backoff_up_to_the_maximum():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    for timeout in (10, 20, 40, 40):
+        clock.now += timeout - 0.1
+        assert not breaker.allow()
+        clock.now += 0.1
+        assert breaker.allow()
+        breaker.record(False)
+        assert breaker.state == OPEN
+    # A success resets the backoff to the initial timeout
+    clock.now += 40
+    assert breaker.allow()
+    breaker.record(True)
+    for _ in range(3):
+        breaker.record(False)
+    clock.now += 10
+    assert breaker.allow()
+
+
+def test_disabled_breaker_never_opens():
+    breaker = CircuitBreaker(0, 10, 40, FakeClock())
+    for _ in range(10):
+        breaker.record(False)
+    assert breaker.allow()
+    assert breaker.state == CLOSED
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        raise ValueError('not JSON')
+
+
+class FakeSession:
+    def __init__(self, response: FakeResponse):
+        self.response = response
+        self.requests = 0
+
+    def get(self, url: str, timeout: tuple[float, float]) -> FakeResponse:
+        self.requests += 1
+        return self.response
+
+
+def test_undecodable_response_only_counts_as_a_failure():
+    clock = FakeClock()
+    api = Api(Config(['--log-level', 'critical']))
+    api.session = FakeSession(FakeResponse(200, b'<html>'))
+    api.circuit_breakers = CircuitBreakers(2, 10, 40, clock=clock)
+    # Counted as a success then a failure, the failures would never add up to the threshold
+    for _ in range(2):
+        assert api.make_request('versions', '/system/versions') == (500, {})
+    breaker = api.circuit_breakers.get('versions')
+    assert breaker.state == OPEN
+    # The half-open probe decodes no better, the breaker opens again instead of closing
+    clock.now += 10
+    assert api.make_request('versions', '/system/versions') == (500, {})
+    assert breaker.state == OPEN
+    assert api.make_request('versions', '/system/versions') == (CIRCUIT_OPEN_STATUS, {})
+    assert api.session.requests == 3
@@ -0,0 +1,128 @@
+import logging
+import threading
+import pytest
+from mailman_exporter import create_registry, reload_config
+from src.api import Api
+from src.collectors.mailman3_collector import Mailman3Collector
+from src.config import RESTART_SETTINGS, Config, parse_config_file
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    for name in ('ME_NAMESPACE', 'ME_LISTS_TOP', 'ME_WEB_LISTEN', 'ME_LIST_PROBES', 'ME_CRAWL_AGGREGATES', 'ME_SHARD_INDEX'):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path / 'exporter.env'
+
+
+def write(path, *lines: str) -> None:
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def load(config_file, *args: str) -> Config:
+    return Config(['--log-level', 'critical', '--mailman.address', 'http://127.0.0.1:1', '--config.file', str(config_file), *args])
+
+
+def test_parse_config_file(tmp_path):
+    path = tmp_path / 'exporter.env'
+    write(path, '# comment', '', 'ME_NAMESPACE=prod', 'export ME_LISTS_TOP = 10', 'ME_LISTS_EXCLUDE="test@.*"',
+          "ME_MAILMAN_USER='admin'", 'ME_EMPTY=')
+    assert parse_config_file(str(path)) == {'ME_NAMESPACE': 'prod', 'ME_LISTS_TOP': '10', 'ME_LISTS_EXCLUDE': 'test@.*',
+                                            'ME_MAILMAN_USER': 'admin', 'ME_EMPTY': ''}
+    write(path, 'ME_NAMESPACE')
+    with pytest.raises(ValueError):
+        parse_config_file(str(path))
+    with pytest.raises(ValueError):
+        parse_config_file(str(tmp_path / 'missing.env'))
+
+
+def test_environment_and_command_line_take_precedence(config_file, monkeypatch):
+    write(config_file, 'ME_NAMESPACE=file', 'ME_LISTS_TOP=10')
+    monkeypatch.setenv('ME_NAMESPACE', 'environment')
+    config = load(config_file)
+    assert (config.namespace, config.lists_top) == ('environment', 10)
+    assert load(config_file, '--lists.top', '20').lists_top == 20
+
+
+def test_reload_applies_the_changed_settings(config_file, caplog):
+    write(config_file, 'ME_NAMESPACE=before', 'ME_LISTS_TOP=10')
+    config = load(config_file)
+    assert config.reload() == set()
+    write(config_file, 'ME_NAMESPACE=after', 'ME_LISTS_TOP=10', 'ME_WEB_LISTEN=0.0.0.0:9999')
+    caplog.set_level(logging.WARNING)
+    assert config.reload() == {'namespace'}
+    # The listen address is only bound at startup, it keeps its running value
+    assert {'hostname', 'port'} <= RESTART_SETTINGS
+    assert (config.namespace, config.prefix, config.hostname, config.port) == ('after', 'after_', 'localhost', 9934)
+    assert 'Configuration reload: port changed, restart the exporter to apply it' in caplog.messages
+    assert 'Configuration reload: hostname changed, restart the exporter to apply it' in caplog.messages
+
+
+def test_failed_reload_keeps_the_running_config(config_file):
+    write(config_file, 'ME_LISTS_TOP=10')
+    config = load(config_file)
+    write(config_file, 'ME_LISTS_TOP=ten')
+    assert config.reload() == set()
+    assert config.lists_top == 10
+
+
+def test_reload_rebuilds_only_the_affected_components(config_file):
+    write(config_file, 'ME_LIST_PROBES=owners', 'ME_CRAWL_AGGREGATES=addresses', 'ME_CRAWL_INTERVAL_IN_SECONDS=3600')
+    config = load(config_file)
+    registry, runtime_collectors = create_registry(config)
+    collector = Mailman3Collector(Api(config), config, registry=registry)
+    try:
+        list_probes, users_crawler, queue_trends = collector.list_probes, collector.users_crawler, collector.queue_trends
+        write(config_file, 'ME_LIST_PROBES=owners,held', 'ME_CRAWL_AGGREGATES=addresses', 'ME_CRAWL_INTERVAL_IN_SECONDS=3600')
+        assert reload_config(config, registry, runtime_collectors, collector) == runtime_collectors
+        assert collector.list_probes is not list_probes
+        assert list(collector.list_probes.probes) == ['owners', 'held']
+        assert (collector.users_crawler, collector.queue_trends) == (users_crawler, queue_trends)
+
+        # Only the first shard crawls, moving to another shard stops the crawler
+        write(config_file, 'ME_LIST_PROBES=owners,held', 'ME_CRAWL_AGGREGATES=addresses', 'ME_CRAWL_INTERVAL_IN_SECONDS=3600',
+              'ME_SHARD_INDEX=1', 'ME_SHARD_COUNT=2')
+        reload_config(config, registry, runtime_collectors, collector)
+        assert collector.users_crawler is None
+        write(config_file, 'ME_LIST_PROBES=owners,held', 'ME_CRAWL_AGGREGATES=addresses', 'ME_CRAWL_INTERVAL_IN_SECONDS=3600',
+              'ME_NAMESPACE=renamed')
+        renamed_collectors = reload_config(config, registry, runtime_collectors, collector)
+        assert collector.users_crawler is not None
+        # Both shard settings reverted to their defaults along with the renaming
+        assert config.shard_index == 0
+        assert renamed_collectors is not runtime_collectors
+        assert [family.name for family in collector.scrape_duration.collect()] == ['renamed_mailman3_scrape_duration_seconds']
+    finally:
+        collector.close()
+
+
+def test_reload_waits_for_the_collection_in_progress(config_file):
+    write(config_file, 'ME_NAMESPACE=before')
+    config = load(config_file)
+    registry, runtime_collectors = create_registry(config)
+    collector = Mailman3Collector(Api(config), config, registry=None)
+    started, release, seen = threading.Event(), threading.Event(), []
+
+    def slow_fetch(deadline=None):
+        started.set()
+        release.wait()
+        seen.append(config.namespace)
+        return {}
+
+    collector.fetch = slow_fetch
+    scrape = threading.Thread(target=lambda: list(collector.collect()))
+    scrape.start()
+    started.wait()
+    write(config_file, 'ME_NAMESPACE=after')
+    reload = threading.Thread(target=reload_config, args=(config, registry, runtime_collectors, collector))
+    try:
+        reload.start()
+        reload.join(0.2)
+        # The reload is held off until the scrape completed with the config it started with
+        assert reload.is_alive() and config.namespace == 'before'
+    finally:
+        release.set()
+        scrape.join()
+        reload.join()
+        collector.close()
+    assert seen == ['before']
+    assert config.namespace == 'after'
@@ -0,0 +1,43 @@
+import re
+import pytest
+from prometheus_client.core import GaugeMetricFamily
+from src.api import Api
+from src.collectors.mailman3_collector import Mailman3Collector
+from src.config import Config, parse_buckets
+from src.list_store import ListStore, cumulative_buckets
+
+
+def test_parse_buckets():
+    assert parse_buckets('10, 1,0,10') == (0.0, 1.0, 10.0)
+    assert parse_buckets('') == ()
+    assert parse_buckets(' , ') == ()
+    # +Inf is always the last bucket, it is not repeated
+    assert parse_buckets('1,inf,+Inf') == (1.0,)
+    assert parse_buckets('inf') == ()
+    for invalid in ('1,ten', 'nan', '1,NaN'):
+        with pytest.raises(ValueError):
+            parse_buckets(invalid)
+
+
+def test_cumulative_buckets():
+    assert cumulative_buckets([], (1.0, 10.0)) == [0, 0, 0]
+    assert cumulative_buckets([3, 5], ()) == [2]
+    # Buckets count the values less than or equal to their bound
+    assert cumulative_buckets([0, 1, 1, 10, 11], (0.0, 1.0, 10.0)) == [1, 3, 4, 5]
+    assert cumulative_buckets([0, 1, 1, 10, 11], (0.5, 1.5)) == [1, 3, 5]
+
+
+def test_histograms_only_count_the_selected_lists():
+    config = Config(['--log-level', 'warning', '--lists.histogram.buckets', '10', '--metrics.lists.histogram', 'true',
+                     '--lists.top', '1'])
+    collector = Mailman3Collector(Api(config), config, registry=None)
+    lists = ListStore(3, exclude=re.compile('dev@.*'))
+    lists.extend([{'fqdn_listname': f"{name}@example.com", 'member_count': count}
+                  for name, count in (('announce', 5), ('dev', 20), ('users', 30))])
+    lists.seal()
+    processing_time = GaugeMetricFamily('processing_time_ms', '', labels=['method'])
+    families = {family.name: family for family in collector.collect_lists(processing_time, (200, lists))}
+    samples = {(sample.name, sample.labels.get('le')): sample.value for sample in families['mailman3_list_member_count'].samples}
+    assert samples[('mailman3_list_member_count_bucket', '10')] == 1
+    assert samples[('mailman3_list_member_count_bucket', '+Inf')] == 2
+    assert samples[('mailman3_list_member_count_sum', None)] == 35
@@ -0,0 +1,35 @@
+from urllib.request import urlopen
+from prometheus_client.registry import CollectorRegistry
+from src.config import Config
+from src.deadline import scrape_deadline
+from src.http_server import start_server
+
+
+class DeadlineRecorder:
+    """Records the deadline each scrape hands to the collectors."""
+
+    def __init__(self):
+        self.deadlines: list = []
+
+    def collect(self):
+        self.deadlines.append(scrape_deadline.get())
+        return []
+
+
+def test_scrapes_follow_a_reloaded_collect_deadline():
+    config = Config(['--log-level', 'critical'])
+    registry = CollectorRegistry(auto_describe=False)
+    recorder = DeadlineRecorder()
+    registry.register(recorder)
+    server = start_server('127.0.0.1', 0, registry, config=config)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        urlopen(url).read()
+        # What a reload does, every component holds this very config
+        config.collect_deadline_in_seconds = 5.0
+        urlopen(url).read()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert recorder.deadlines[0] is None
+    assert recorder.deadlines[1] is not None
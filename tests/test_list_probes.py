@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Any
+from src.api import Api
+from src.config import Config
+from src.list_probes import ListProbes
+
+LISTS = [f"list{index}@example.com" for index in range(10)]
+
+
+class BlockingApi(Api):
+    """Answers count requests once released, the way a stalled Mailman would."""
+
+    def __init__(self, config: Config):
+        super().__init__(config)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.endpoints: list[str] = []
+
+    def count(self, name: str, endpoint: str) -> tuple[int, Any]:
+        self.endpoints.append(endpoint)
+        self.started.set()
+        self.release.wait()
+        return 200, {'total_size': 7}
+
+
+def list_probes(*args: str) -> tuple[BlockingApi, ListProbes]:
+    config = Config(['--log-level', 'warning', '--lists.probes', 'owners', '--lists.probes.budget', '3',
+                     '--lists.probes.concurrency', '1', *args])
+    api = BlockingApi(config)
+    return api, ListProbes(api, config)
+
+
+def test_queue_stays_bounded_while_probes_block():
+    api, probes = list_probes()
+    try:
+        probes.refresh(LISTS)
+        api.started.wait()
+        for _ in range(20):
+            probes.refresh(LISTS)
+            assert probes._executor._work_queue.qsize() <= 3
+        # Only the first probe of the first slice ever started
+        assert api.endpoints == ['/lists/list0@example.com/roster/owner']
+        api.release.set()
+        deadline = time.monotonic() + 10
+        while len(probes.counts['owners']) < len(LISTS) and time.monotonic() < deadline:
+            probes.refresh(LISTS)
+            time.sleep(0.01)
+        # The probes cancelled while the first one blocked are sent again, every list is counted
+        assert probes.counts['owners'] == {fqdn_listname: 7 for fqdn_listname in LISTS}
+    finally:
+        api.release.set()
+        probes.close()
+
+
+def test_refresh_never_waits_for_the_probes():
+    api, probes = list_probes()
+    try:
+        started = time.monotonic()
+        probes.refresh(LISTS)
+        api.started.wait()
+        probes.refresh(LISTS)
+        # Scrapes serve the counts recorded so far instead of waiting for the blocked probe
+        assert time.monotonic() - started < 1
+        assert probes.counts['owners'] == {}
+    finally:
+        api.release.set()
+        probes.close()
+
+
+def test_close_drops_queued_probes():
+    api, probes = list_probes()
+    probes.refresh(LISTS)
+    api.started.wait()
+    probes.close()
+    api.release.set()
+    probes._executor.shutdown(wait=True)
+    assert len(api.endpoints) == 1
@@ -0,0 +1,51 @@
+import re
+from src.list_store import ListStore
+
+ENTRIES = [{'fqdn_listname': f"list{index}@d{index % 3}.example.com", 'member_count': index} for index in range(500)]
+
+
+def shard(index: int, count: int, **filters) -> ListStore:
+    lists = ListStore(len(ENTRIES), shard_index=index, shard_count=count, **filters)
+    lists.extend(ENTRIES)
+    lists.seal()
+    return lists
+
+
+def test_shards_partition_the_lists():
+    names = {entry['fqdn_listname'] for entry in ENTRIES}
+    for count in (2, 3, 7):
+        shards = [set(shard(index, count).names) for index in range(count)]
+        assert sum(len(names) for names in shards) == len(ENTRIES)
+        assert set().union(*shards) == names
+        # No shard is left empty by the hash over this many lists
+        assert all(shards)
+
+
+def test_shard_assignment_is_stable():
+    # crc32 of the name, the same in every process and Python version unlike hash()
+    assignment = {'announce@example.com': 1, 'dev@example.com': 3, 'users@example.com': 2}
+    for fqdn_listname, index in assignment.items():
+        assert [ListStore(shard_index=shard_index, shard_count=4).selects(fqdn_listname) for shard_index in range(4)] == \
+            [shard_index == index for shard_index in range(4)]
+
+
+def test_filters_apply_before_sharding():
+    include = re.compile(r'.*@d0\.example\.com')
+    selected = [set(shard(index, 3, include=include).names) for index in range(3)]
+    assert set().union(*selected) == {entry['fqdn_listname'] for entry in ENTRIES if entry['fqdn_listname'].endswith('@d0.example.com')}
+    assert sum(len(names) for names in selected) == len(set().union(*selected))
+
+
+def test_rollups_cover_every_list_on_every_shard():
+    for index in range(3):
+        lists = shard(index, 3)
+        assert sum(lists.domain_lists.values()) == len(ENTRIES)
+        assert sum(lists.domain_members.values()) == sum(range(500))
+
+
+def test_top_is_per_shard():
+    shards = [shard(index, 2) for index in range(2)]
+    tops = [lists.top(5) for lists in shards]
+    for lists, top in zip(shards, tops):
+        assert top == sorted(lists, key=lambda entry: entry[1], reverse=True)[:5]
+    assert set(tops[0]).isdisjoint(tops[1])
@@ -0,0 +1,17 @@
+from src.collectors.log_collector import LogCollector
+from src.config import Config
+
+
+def test_collect_releases_the_lock_before_yielding(tmp_path):
+    config = Config(['--log-level', 'warning', '--logs.directory', str(tmp_path)])
+    collector = LogCollector(config, registry=None)
+    try:
+        families = collector.collect()
+        first = next(families)
+        assert first.name == 'mailman3_log_messages_delivered'
+        # An abandoned or slow consumer does not keep the tailer from parsing
+        assert collector._lock.acquire(blocking=False)
+        collector._lock.release()
+        families.close()
+    finally:
+        collector.close()
@@ -0,0 +1,90 @@
+import os
+from src.log_tailer import TailedFile, load_offsets, save_offsets
+
+
+def lines(tailed: TailedFile) -> list[str]:
+    return [line for batch in tailed.poll() for line in batch]
+
+
+def append(path, text: str) -> None:
+    with open(path, 'a') as file:
+        file.write(text)
+
+
+def test_starts_at_the_end_and_reads_new_lines_once(tmp_path):
+    path = tmp_path / 'smtp.log'
+    append(path, 'before start\n')
+    tailed = TailedFile(str(path))
+    assert lines(tailed) == []
+    append(path, 'one\ntw')
+    assert lines(tailed) == ['one']
+    append(path, 'o\nthree\n')
+    assert lines(tailed) == ['two', 'three']
+    assert lines(tailed) == []
+
+
+def test_rotation_between_reads(tmp_path):
+    path = tmp_path / 'smtp.log'
+    append(path, '')
+    tailed = TailedFile(str(path))
+    assert lines(tailed) == []
+    append(path, 'one\n')
+    assert lines(tailed) == ['one']
+    # Lines written to the old file after the last read are still read once it was moved away
+    append(path, 'two\n')
+    os.rename(path, tmp_path / 'smtp.log.1')
+    append(path, 'three\nfour\n')
+    assert lines(tailed) == ['two', 'three', 'four']
+    assert tailed.rotations == 1
+    append(path, 'five\n')
+    assert lines(tailed) == ['five']
+    assert tailed.rotations == 1
+
+
+def test_truncation_between_reads(tmp_path):
+    path = tmp_path / 'smtp.log'
+    append(path, '')
+    tailed = TailedFile(str(path))
+    assert lines(tailed) == []
+    append(path, 'a rather long first line\nsecond\n')
+    assert lines(tailed) == ['a rather long first line', 'second']
+    with open(path, 'w') as file:
+        file.write('new\n')
+    assert lines(tailed) == ['new']
+    assert tailed.truncations == 1
+    append(path, 'next\n')
+    assert lines(tailed) == ['next']
+    assert tailed.truncations == 1
+
+
+def test_resumes_from_saved_offsets(tmp_path):
+    path = tmp_path / 'smtp.log'
+    append(path, '')
+    tailed = TailedFile(str(path))
+    assert lines(tailed) == []
+    append(path, 'one\n')
+    assert lines(tailed) == ['one']
+    offsets_path = str(tmp_path / 'offsets.json')
+    save_offsets(offsets_path, {'smtp': tailed})
+    tailed.close()
+    append(path, 'two\n')
+    inode, offset = load_offsets(offsets_path)['smtp']
+    assert lines(TailedFile(str(path), inode, offset)) == ['two']
+
+
+def test_rotation_while_not_running(tmp_path):
+    path = tmp_path / 'smtp.log'
+    append(path, 'one\n')
+    stat = os.stat(path)
+    os.rename(path, tmp_path / 'smtp.log.1')
+    append(path, 'two\n')
+    # The saved inode no longer is the file's, it is read from the start
+    assert lines(TailedFile(str(path), stat.st_ino, stat.st_size)) == ['two']
+
+
+def test_file_created_after_start(tmp_path):
+    path = tmp_path / 'smtp.log'
+    tailed = TailedFile(str(path))
+    assert lines(tailed) == []
+    append(path, 'first\n')
+    assert lines(tailed) == ['first']
@@ -0,0 +1,83 @@
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+from src.config import Config
+from src.paging import count_endpoint, lists_walk, page_endpoint, run_walk, run_walk_async
+
+
+def lists_server(total: int):
+    requests = []
+
+    def request(name: str, endpoint: str) -> tuple[int, dict]:
+        requests.append(endpoint)
+        query = parse_qs(urlsplit(endpoint).query)
+        count, page = int(query['count'][0]), int(query['page'][0])
+        start, stop = min(total, (page - 1) * count), min(total, page * count)
+        entries = [{'fqdn_listname': f"list{index}@example.com", 'member_count': index} for index in range(start, stop)]
+        return 200, {'start': start, 'total_size': total, **({'entries': entries} if entries else {})}
+
+    return request, requests
+
+
+def test_page_endpoint_appends_to_existing_query():
+    assert page_endpoint('/lists', 10, 2) == '/lists?count=10&page=2'
+    assert page_endpoint('/members?fields=user', 10, 1) == '/members?fields=user&count=10&page=1'
+    assert count_endpoint('/users') == '/users?count=1&page=1'
+
+
+def test_lists_walk_reads_every_page():
+    config = Config(['--log-level', 'warning', '--mailman.page.size', '3'])
+    request, requests = lists_server(7)
+    status, lists = run_walk(lists_walk(config), request)
+    assert status == 200
+    assert len(requests) == 3
+    assert lists.names == [f"list{index}@example.com" for index in range(7)]
+
+
+def test_lists_walk_stops_on_error():
+    config = Config(['--log-level', 'warning'])
+    assert run_walk(lists_walk(config), lambda name, endpoint: (503, {})) == (503, {})
+
+
+def test_threaded_and_asyncio_walks_agree():
+    config = Config(['--log-level', 'warning', '--mailman.page.size', '2'])
+    request, _ = lists_server(5)
+
+    async def async_request(name: str, endpoint: str) -> tuple[int, dict]:
+        return request(name, endpoint)
+
+    _, threaded = run_walk(lists_walk(config), request)
+    _, asynchronous = asyncio.run(run_walk_async(lists_walk(config), async_request))
+    assert list(threaded) == list(asynchronous)
+
+
+def test_lists_walk_restarts_when_the_collection_changes():
+    config = Config(['--log-level', 'warning', '--mailman.page.size', '2'])
+    request, requests = lists_server(5)
+    created = []
+
+    def changing_request(name: str, endpoint: str) -> tuple[int, dict]:
+        # A list is created in front of the others right after the first page was read
+        status, resp = request(name, endpoint)
+        if len(requests) == 2 and not created:
+            created.append(True)
+            return status, {**resp, 'total_size': resp['total_size'] + 1}
+        return status, resp
+
+    _, lists = run_walk(lists_walk(config), changing_request)
+    assert len(requests) == 5
+    assert lists.names == [f"list{index}@example.com" for index in range(5)]
+
+
+def test_lists_walk_drops_duplicates_when_the_collection_keeps_changing():
+    config = Config(['--log-level', 'warning', '--mailman.page.size', '2'])
+    sizes = iter(range(100, 200))
+
+    def shifting_request(name: str, endpoint: str) -> tuple[int, dict]:
+        # Every page overlaps the previous one, as if a list was created before each request
+        page = int(parse_qs(urlsplit(endpoint).query)['page'][0])
+        entries = [{'fqdn_listname': f"list{index}@example.com", 'member_count': 1} for index in (page - 1, page)]
+        return 200, {'total_size': 4 if page == 3 else next(sizes), 'entries': entries}
+
+    _, lists = run_walk(lists_walk(config), shifting_request)
+    assert lists.names == [f"list{index}@example.com" for index in range(4)]
+    assert lists.domain_lists == {'example.com': 4}
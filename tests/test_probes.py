@@ -0,0 +1,37 @@
+from prometheus_client import generate_latest
+from benchmarks.fake_mailman import FakeMailman
+from src.config import Config
+from src.probes import Probe, Target
+
+
+def scrape(probe: Probe) -> dict[str, float]:
+    samples = {}
+    for line in generate_latest(probe.registry).decode().splitlines():
+        if line.startswith(('mailman3_lists ', 'mailman3_up ', 'mailman3_lists{', 'mailman3_up{')):
+            name, _, value = line.rpartition(' ')
+            samples[name.partition('{')[0]] = float(value)
+    return samples
+
+
+def test_targets_keep_their_own_snapshot(tmp_path):
+    config = Config(['--log-level', 'critical', '--cache.snapshot', str(tmp_path / 'snapshot.json'),
+                     '--queue.backend', 'filesystem', '--queue.path', str(tmp_path), '--shard.count', '2', '--shard.index', '1'])
+    servers = {'a': FakeMailman(lists=5).start(), 'b': FakeMailman(lists=9).start()}
+    try:
+        for name, server in servers.items():
+            probe = Probe(Target(name, server.address, 'user', 'password'), config)
+            assert probe.config.queue_backend == 'rest'
+            assert (probe.config.shard_index, probe.config.shard_count) == (0, 1)
+            assert scrape(probe)['mailman3_lists'] == {'a': 5, 'b': 9}[name]
+            probe.close()
+    finally:
+        for server in servers.values():
+            server.stop()
+    assert sorted(path.name for path in tmp_path.glob('snapshot*')) == ['snapshot.a.json', 'snapshot.b.json']
+    # Restarted while its Mailman is down, a target serves its own saved data
+    probe = Probe(Target('a', 'http://127.0.0.1:1', 'user', 'password'), config)
+    try:
+        samples = scrape(probe)
+    finally:
+        probe.close()
+    assert samples == {'mailman3_lists': 5, 'mailman3_up': 0}
@@ -0,0 +1,66 @@
+import os
+import time
+from prometheus_client.core import GaugeMetricFamily
+from src.api import Api
+from src.collectors.mailman3_collector import Mailman3Collector
+from src.config import Config
+from src.queue_scanner import QueueScanner
+
+
+def enqueue(directory, name: str) -> None:
+    directory.mkdir(exist_ok=True)
+    (directory / name).write_bytes(b'')
+
+
+def test_counts_messages_and_oldest_enqueue_time(tmp_path):
+    enqueue(tmp_path / 'out', '1700000100.5+abc.pck')
+    enqueue(tmp_path / 'out', '1700000000.25+def.pck')
+    enqueue(tmp_path / 'out', '1700000200+ghi.bak')
+    enqueue(tmp_path / 'in', 'not-a-timestamp.pck')
+    os.utime(tmp_path / 'in' / 'not-a-timestamp.pck', (1600000000, 1600000000))
+    status, resp = QueueScanner(str(tmp_path)).scan()
+    assert status == 200
+    entries = {entry['name']: entry for entry in resp['entries']}
+    assert (entries['out']['count'], entries['out']['oldest']) == (2, 1700000000.25)
+    # Files not named after their enqueue time fall back to their mtime
+    assert (entries['in']['count'], entries['in']['oldest']) == (1, 1600000000)
+
+
+def test_empty_queue(tmp_path):
+    (tmp_path / 'bad').mkdir()
+    status, resp = QueueScanner(str(tmp_path)).scan()
+    assert status == 200
+    assert resp['entries'] == [{'name': 'bad', 'count': 0, 'directory': str(tmp_path / 'bad'), 'oldest': None}]
+
+
+def test_unchanged_directories_are_not_listed_again(tmp_path):
+    enqueue(tmp_path / 'out', '1700000000+abc.pck')
+    scanner = QueueScanner(str(tmp_path))
+    scanner.scan()
+    scanner.scan()
+    assert scanner.rescans == 1
+
+
+def test_file_removed_between_listing_and_stat(tmp_path):
+    enqueue(tmp_path / 'out', 'dequeued.pck')
+    with os.scandir(tmp_path / 'out') as files:
+        file = next(files)
+        os.remove(file.path)
+        assert QueueScanner.enqueued_at(file) is None
+
+
+def test_missing_queue_directory(tmp_path):
+    assert QueueScanner(str(tmp_path / 'missing')).scan() == (500, {})
+
+
+def test_oldest_age_of_rest_shaped_entries(tmp_path):
+    config = Config(['--log-level', 'warning', '--queue.backend', 'filesystem', '--queue.path', str(tmp_path)])
+    collector = Mailman3Collector(Api(config), config, registry=None)
+    now = time.time()
+    # The REST API has no oldest field, such entries come from a snapshot or the last known value
+    entries = [{'name': 'in', 'count': 1}, {'name': 'out', 'count': 2, 'oldest': now - 60}]
+    processing_time = GaugeMetricFamily('processing_time_ms', '', labels=['method'])
+    families = {family.name: family for family in collector.collect_queue(processing_time, (200, {'entries': entries}))}
+    ages = {sample.labels['queue']: sample.value for sample in families['mailman3_queue_oldest_age_seconds'].samples}
+    assert list(ages) == ['out']
+    assert 60 <= ages['out'] < 70
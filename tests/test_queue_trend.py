@@ -0,0 +1,45 @@
+import pytest
+from src.api import Api
+from src.cache import Cache
+from src.config import Config
+from src.queue_trend import QueueTrend, QueueTrends
+
+
+def queues(**counts: int) -> dict:
+    return {'entries': [{'name': name, 'count': count} for name, count in counts.items()]}
+
+
+def test_trend_fits_known_points():
+    trend = QueueTrend(window=100, capacity=10)
+    for timestamp, count in ((0, 10), (10, 30), (20, 50)):
+        trend.add(timestamp, count)
+    assert trend.growth_rate == pytest.approx(2.0)
+    assert trend.drain_eta == float('inf')
+
+
+def test_samples_are_stamped_with_the_fetch_time():
+    trends = QueueTrends(window=100, capacity=10)
+    # Scraped at irregular times, the responses were fetched 10 seconds apart
+    for fetched_at, count in ((1000.0, 100), (1010.0, 80), (1020.0, 60)):
+        trends.observe(queues(out=count), fetched_at)
+    assert [timestamp for timestamp, _ in trends.trends['out'].samples] == [1000.0, 1010.0, 1020.0]
+    assert trends.trends['out'].growth_rate == pytest.approx(-2.0)
+    assert trends.trends['out'].drain_eta == pytest.approx(30.0)
+
+
+def test_a_cached_response_is_sampled_once():
+    trends = QueueTrends(window=100, capacity=10)
+    response = queues(out=5)
+    trends.observe(response, 1000.0)
+    trends.observe(response, 1005.0)
+    assert list(trends.trends['out'].samples) == [(1000.0, 5)]
+
+
+def test_cache_reports_when_each_response_was_fetched():
+    config = Config(['--log-level', 'warning'])
+    cache = Cache(Api(config), config)
+    response = (200, queues(out=1))
+    cache.store('queue', response, 1234.0)
+    assert cache.fetched_at('queue', response) == 1234.0
+    # A response the cache does not hold was fetched for this scrape
+    assert cache.fetched_at('queue', (200, queues(out=2))) > 1234.0
@@ -0,0 +1,99 @@
+import threading
+import time
+import pytest
+from src.api import Api
+from src.collectors.mailman3_collector import COLLECT_KEY, Mailman3Collector
+from src.config import Config
+from src.deadline import scrape_deadline
+from src.single_flight import SingleFlight
+
+
+def start_leader(single_flight: SingleFlight, release: threading.Event, result: str = 'leader') -> threading.Thread:
+    started = threading.Event()
+
+    def function() -> str:
+        started.set()
+        release.wait()
+        return result
+
+    leader = threading.Thread(target=single_flight.do, args=(COLLECT_KEY, function))
+    leader.start()
+    started.wait()
+    return leader
+
+
+def test_followers_share_the_leader_result():
+    single_flight, release = SingleFlight(), threading.Event()
+    leader = start_leader(single_flight, release)
+    results = []
+    follower = threading.Thread(target=lambda: results.append(single_flight.do(COLLECT_KEY, lambda: 'follower')))
+    follower.start()
+    release.set()
+    follower.join()
+    leader.join()
+    assert results == ['leader']
+    assert single_flight.coalesced[COLLECT_KEY] == 1
+
+
+def test_followers_fall_back_on_timeout():
+    single_flight, release = SingleFlight(), threading.Event()
+    leader = start_leader(single_flight, release)
+    start = time.monotonic()
+    assert single_flight.do(COLLECT_KEY, lambda: 'follower', timeout=0.05, fallback=lambda: 'fallback') == 'fallback'
+    assert time.monotonic() - start < 1
+    with pytest.raises(TimeoutError):
+        single_flight.do(COLLECT_KEY, lambda: 'follower', timeout=0)
+    release.set()
+    leader.join()
+
+
+def test_scrape_joining_a_slow_collection_serves_the_last_known_values():
+    config = Config(['--log-level', 'critical', '--mailman.address', 'http://127.0.0.1:1', '--cache', 'false'])
+    collector = Mailman3Collector(Api(config), config, registry=None)
+    collector.cache.latest['users'] = (200, {'total_size': 42})
+    started, release = threading.Event(), threading.Event()
+
+    def slow_fetch(deadline=None):
+        started.set()
+        release.wait()
+        return {}
+
+    collector.fetch = slow_fetch
+    leader = threading.Thread(target=lambda: list(collector.collect()))
+    leader.start()
+    started.wait()
+    token = scrape_deadline.set(time.monotonic() + 0.05)
+    try:
+        families = {family.name: family for family in collector.collect()}
+    finally:
+        scrape_deadline.reset(token)
+        release.set()
+        leader.join()
+    assert [sample.value for sample in families['mailman3_users'].samples] == [42]
+    assert {sample.labels['endpoint'] for sample in families['mailman3_stale'].samples if sample.value == 1} == \
+        set(collector.endpoints().keys())
+    assert collector.deadline_exceeded['users'] == 1
+
+
+def test_up_is_never_served_from_an_earlier_success():
+    config = Config(['--log-level', 'critical', '--mailman.address', 'http://127.0.0.1:1', '--cache', 'false',
+                     '--collect.concurrency', '2'])
+    collector = Mailman3Collector(Api(config), config, registry=None)
+    release = threading.Event()
+    collector.cache.latest['up'] = (200, {'mailman_version': 'GNU Mailman 3.3'})
+    collector.cache.latest['users'] = (200, {'total_size': 42})
+
+    def hung() -> tuple:
+        release.wait()
+        return 500, {}
+
+    collector.endpoints = lambda: {'up': hung, 'users': hung}
+    try:
+        for _ in range(3):
+            responses = collector.fetch(deadline=time.monotonic() + 0.05)
+            # Mailman hangs: up is reported down, other endpoints keep their last known value
+            assert responses == {'up': (504, {}), 'users': (200, {'total_size': 42})}
+            assert collector.stale == {'up', 'users'}
+    finally:
+        release.set()
+        collector.close()
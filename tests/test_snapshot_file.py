@@ -0,0 +1,82 @@
+import json
+import os
+from src.api import Api
+from src.cache import Cache
+from src.config import Config
+from src.list_store import ListStore
+from src.snapshot_file import load_snapshot, save_snapshot
+
+
+def list_store() -> ListStore:
+    lists = ListStore(3)
+    lists.extend([{'fqdn_listname': f"{name}@example.com", 'member_count': count}
+                  for name, count in (('announce', 10), ('dev', 20), ('users', 30))])
+    lists.seal()
+    return lists
+
+
+def cache(snapshot_file: str, *args: str) -> Cache:
+    config = Config(['--log-level', 'warning', '--cache.snapshot', snapshot_file, *args])
+    return Cache(Api(config), config)
+
+
+def test_snapshot_is_plain_json(tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    save_snapshot(path, {'domains': (200, {'total_size': 2}), 'lists': (200, list_store())})
+    with open(path) as file:
+        snapshot = json.load(file)
+    assert snapshot['responses']['domains'] == {'status': 200, 'body': {'total_size': 2}}
+    assert snapshot['responses']['lists']['lists']['names'] == ['announce@example.com', 'dev@example.com', 'users@example.com']
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_restored_lists_are_filtered_with_the_current_settings(tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    save_snapshot(path, {'lists': (200, list_store())})
+    restored = cache(path, '--lists.exclude', 'dev@.*')
+    restored.restore(['lists'])
+    status, lists = restored.restored['lists']
+    assert status == 200
+    assert list(lists) == [('announce@example.com', 10), ('users@example.com', 30)]
+    # Rollups account for every list, whatever the filters
+    assert lists.domain_members == {'example.com': 60}
+    assert lists.total_size == 3
+
+
+def test_unreadable_or_foreign_files_are_ignored(tmp_path):
+    path = tmp_path / 'snapshot.json'
+    path.write_bytes(b'\x80\x04\x95 not json')
+    assert load_snapshot(str(path), ListStore.from_snapshot) is None
+    path.write_text(json.dumps({'version': 1, 'saved_at': 0, 'responses': {}}))
+    assert load_snapshot(str(path), ListStore.from_snapshot) is None
+    path.write_text(json.dumps({'version': 2, 'saved_at': 0, 'responses': {'lists': {'status': 200}}}))
+    assert load_snapshot(str(path), ListStore.from_snapshot) is None
+    assert load_snapshot(str(tmp_path / 'missing.json'), ListStore.from_snapshot) is None
+
+
+def test_persist_skips_unchanged_cache_generations(tmp_path):
+    path = tmp_path / 'snapshot.json'
+    cached = cache(str(path))
+    response = (200, {'total_size': 2})
+    cached.store('domains', response, 0.0)
+    cached.persist({'domains': response})
+    assert path.exists()
+    path.unlink()
+    cached.persist({'domains': (200, {'total_size': 3})})
+    assert not path.exists()
+    cached.store('domains', (200, {'total_size': 3}), 0.0)
+    cached.persist({'domains': (200, {'total_size': 3})})
+    assert path.exists()
+
+
+def test_persist_without_cache_saves_at_most_once_per_cache_duration(tmp_path):
+    path = tmp_path / 'snapshot.json'
+    uncached = cache(str(path), '--cache', 'false')
+    uncached.persist({'domains': (200, {'total_size': 2})})
+    assert path.exists()
+    path.unlink()
+    uncached.persist({'domains': (200, {'total_size': 3})})
+    assert not path.exists()
+    uncached._persisted_at -= uncached.refresh_interval
+    uncached.persist({'domains': (200, {'total_size': 3})})
+    assert json.loads(path.read_text())['responses']['domains']['body'] == {'total_size': 3}
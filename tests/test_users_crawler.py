@@ -0,0 +1,116 @@
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+from src.api import Api
+from src.config import Config
+from src.hyperloglog import HyperLogLog
+from src.users_crawler import UNKNOWN_LANGUAGE, UNSET_LANGUAGE, UsersCrawler
+
+USERS = [{'user_id': index, 'self_link': f"http://localhost/3.1/users/{index}"} for index in range(7)]
+LANGUAGES = {0: 'en', 1: 'fr', 2: 'en', 4: 'de', 5: 'en', 6: 'fr'}
+MEMBERS = [{'user': USERS[index]['self_link']} for index in (0, 0, 1, 3, 3, 3)]
+
+
+class FakeApi(Api):
+    """Serves pages of a fixed set of users and members, failing the endpoints listed in failing."""
+
+    def __init__(self, config: Config):
+        super().__init__(config)
+        self.endpoints: list[str] = []
+        self.failing: dict[str, int] = {}
+
+    def make_request(self, name: str, endpoint: str) -> tuple[int, Any]:
+        self.endpoints.append(endpoint)
+        if self.failing.get(endpoint, 0) > 0:
+            self.failing[endpoint] -= 1
+            return 500, {}
+        path, query = urlsplit(endpoint).path, parse_qs(urlsplit(endpoint).query)
+        if path.endswith('/preferences'):
+            language = LANGUAGES.get(int(path.split('/')[2]))
+            return 200, {} if language is None else {'preferred_language': language}
+        collection = {'/users': USERS, '/members': MEMBERS}[path]
+        count, page = int(query['count'][0]), int(query['page'][0])
+        return 200, {'total_size': len(collection), 'entries': collection[(page - 1) * count:page * count]}
+
+
+def users_crawler(aggregate: str, *args: str) -> tuple[FakeApi, UsersCrawler]:
+    config = Config(['--log-level', 'warning', '--crawl.aggregates', aggregate, '--crawl.page.size', '3', *args])
+    api = FakeApi(config)
+    # Not started, the steps are driven by the test
+    return api, UsersCrawler(api, config)
+
+
+def test_languages_pass_completes_over_every_user():
+    api, crawler = users_crawler('languages', '--crawl.pages', '10')
+    crawl = crawler.crawls['languages']
+    crawler.step(crawl)
+    assert crawler.aggregates('languages') == {'en': 3, 'fr': 2, 'de': 1, UNSET_LANGUAGE: 1}
+    assert (crawl.passes, crawl.page, crawl.offset) == (1, 1, 0)
+    assert crawler.requests == len(api.endpoints) == 3 + len(USERS)
+
+
+def test_step_resumes_from_the_next_page():
+    api, crawler = users_crawler('languages')
+    crawl = crawler.crawls['languages']
+    crawler.step(crawl)
+    assert crawler.aggregates('languages') is None
+    assert (crawl.page, crawl.offset) == (2, 0)
+    api.endpoints.clear()
+    crawler.step(crawl)
+    assert api.endpoints[0] == '/users?count=3&page=2'
+    crawler.step(crawl)
+    assert crawler.aggregates('languages') == {'en': 3, 'fr': 2, 'de': 1, UNSET_LANGUAGE: 1}
+
+
+def test_request_budget_stops_within_a_page():
+    api, crawler = users_crawler('languages', '--crawl.pages', '10', '--crawl.requests', '3')
+    crawl = crawler.crawls['languages']
+    crawler.step(crawl)
+    # The page and two users, the step resumes from the third user of the same page
+    assert api.endpoints == ['/users?count=3&page=1', '/users/0/preferences', '/users/1/preferences']
+    assert (crawl.page, crawl.offset) == (1, 2)
+    api.endpoints.clear()
+    crawler.step(crawl)
+    assert api.endpoints == ['/users?count=3&page=1', '/users/2/preferences', '/users?count=3&page=2']
+    while crawl.passes == 0:
+        crawler.step(crawl)
+    assert crawler.aggregates('languages') == {'en': 3, 'fr': 2, 'de': 1, UNSET_LANGUAGE: 1}
+
+
+def test_failed_page_is_requested_again():
+    api, crawler = users_crawler('languages')
+    crawl = crawler.crawls['languages']
+    crawler.step(crawl)
+    api.failing['/users?count=3&page=2'] = 1
+    crawler.step(crawl)
+    assert (crawl.page, crawl.offset) == (2, 0)
+    crawler.step(crawl)
+    crawler.step(crawl)
+    assert crawler.aggregates('languages') == {'en': 3, 'fr': 2, 'de': 1, UNSET_LANGUAGE: 1}
+
+
+def test_failed_preferences_are_counted_as_unknown():
+    api, crawler = users_crawler('languages', '--crawl.pages', '10')
+    api.failing['/users/1/preferences'] = 1
+    crawler.step(crawler.crawls['languages'])
+    assert crawler.aggregates('languages') == {'en': 3, 'fr': 1, 'de': 1, UNSET_LANGUAGE: 1, UNKNOWN_LANGUAGE: 1}
+
+
+def test_memberships_pass():
+    api, crawler = users_crawler('memberships', '--crawl.pages', '10')
+    crawl = crawler.crawls['memberships']
+    api.failing['/users?count=1&page=1'] = 1
+    crawler.step(crawl)
+    # Without the user count the pass starts over rather than publish a partial aggregate
+    assert crawler.aggregates('memberships') is None
+    assert (crawl.page, crawl.passes) == (1, 0)
+    crawler.step(crawl)
+    assert crawler.aggregates('memberships') == {'memberships': 6, 'users_without_memberships': 4}
+
+
+def test_hyperloglog_estimate():
+    assert HyperLogLog().estimate() == 0
+    counter = HyperLogLog()
+    for index in range(20000):
+        counter.add(f"http://localhost/3.1/users/{index % 10000}")
+    assert abs(counter.estimate() - 10000) < 300
+    assert len(counter.registers) == 1 << 14